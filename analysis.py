@@ -3,72 +3,97 @@ from datetime import datetime
 import os
 from pathlib import Path
 import pickle
+import hashlib
+import json
+from snapshot_history import SnapshotHistory
+from presentation import format_report
+from cohorts import CohortEngine
+from cost_basis import CostBasis
+
+# Typed result table at full precision, rounding and formatting happen in
+# presentation.format_report
+RESULT_COLUMNS = [
+    "Pair", "#Tr", "USD_spent", "USD_spent%", "USD_value", "USD_value%", "PnL",
+    "pnl%", "AvPr", "CrPr", "Pr_diff%", "BuyExtr$", "Expct T", "Avlbl T",
+    "USD_sell", "Realized", "Unrealized", "Hold d", "MC", "MC 30d%", "Cohort"
+]
+NUMERIC_COLUMNS = [column for column in RESULT_COLUMNS if column not in ("Pair", "Cohort")]
 
 class Analysis:
-    def __init__(self, binance_ops, external_services):
-        self.binance = binance_ops
-        self.external = external_services
-        
-    def get_cohort(self, cap):
+    def __init__(self, binance_ops, external_services, interactive=True, cost_method="fifo"):
         """
-        Classify market cap into cohorts
         Args:
-            cap: Market cap value (can be numeric or string like '1.4M' or '2.5B')
+            binance_ops: BinanceOperations instance
+            external_services: ExternalServices instance
+            interactive (bool): If False, unknown tokens are reported instead of
+                prompting for a mapping (used by worker processes)
+            cost_method (str): Lot matching for realized PnL: 'fifo', 'lifo' or 'average'
         """
-        try:
-            # If it's already a number
-            if isinstance(cap, (int, float)):
-                number = cap / 1e6  # Convert to millions
-            else:
-                # Parse string format (e.g., "1.4M" or "2.5B")
-                parts = cap.split()
-                if not parts:
-                    return "Unknown"
-                
-                value = float(parts[0])
-                if cap.upper().endswith('B'):
-                    value *= 1000  # Convert billions to millions
-                elif cap.upper().endswith('M'):
-                    value = value  # Already in millions
-                else:
-                    value /= 1e6  # Convert raw value to millions
-                number = value
-
-            # Classify based on millions
-            if number < 200:
-                return "Tiny, <200m"
-            elif 200 <= number < 2000:
-                return "Small, 200m-2b"
-            elif 2000 <= number < 9000:
-                return "Big, 2b-9b"
-            else:
-                return "Huge, >9b"
-        except (ValueError, IndexError, TypeError):
-            return "Unknown"
-
+        self.binance = binance_ops
+        self.external = external_services
+        self.interactive = interactive
+        self.unmapped_tokens = set()
+        self.unchanged = False
+        self.run_cache_file = self.binance.data_dir / "run_cache.pkl"
+        history_dir = Path("History")
+        if self.binance.account:
+            history_dir = history_dir / self.binance.account
+        self.history = SnapshotHistory(history_dir)
+        self.cohorts = CohortEngine()
+        self.cohort_summary = None
+        self.cost_basis = CostBasis(cost_method)
+        
     def calculate_percentages(self, df):
-        """Calculate percentage values for USD spent and value"""
+        """Calculate each position's share of total USD spent and value"""
         # Get total values from the 'TOTAL' row
-        total_spent = df.loc[df['Pair'] == 'TOTAL', 'USD_spent'].values[0]
-        df['USD_value'] = df['USD_value'].astype(float)
-        total_value = df.loc[df['Pair'] == 'TOTAL', 'USD_value'].values[0]
+        is_total = df['Pair'] == 'TOTAL'
+        total_spent = df.loc[is_total, 'USD_spent'].values[0]
+        total_value = df.loc[is_total, 'USD_value'].values[0]
 
         # Calculate percentages
-        df.loc[df['Pair'] != 'TOTAL', 'USD_spent%'] = (df['USD_spent'] / total_spent * 100).round(1)
-        df.loc[df['Pair'] != 'TOTAL', 'USD_value%'] = (df['USD_value'] / total_value * 100).round(1)
+        df['USD_spent%'] = (df['USD_spent'] / total_spent * 100).where(~is_total)
+        df['USD_value%'] = (df['USD_value'] / total_value * 100).where(~is_total)
+        return df
 
-        # Format values with percentages
-        df['USD_spent'] = df['USD_spent'].astype(str)
-        df['USD_value'] = df['USD_value'].astype(str)
-        df.loc[df['Pair'] != 'TOTAL', 'USD_spent'] = df['USD_spent'] + " (" + df['USD_spent%'].astype(str) + "%)"
-        df.loc[df['Pair'] != 'TOTAL', 'USD_value'] = df['USD_value'] + " (" + df['USD_value%'].astype(str) + "%)"
+    def show_history(self, symbol, last_n=10):
+        """
+        Print a symbol's spent, value and PnL over the most recent runs
 
-        return df.drop(columns=["USD_spent%", "USD_value%"])
+        Args:
+            symbol (str): Pair or base asset, e.g. 'BTC/USDT', 'btc' or 'TOTAL'
+            last_n (int): Number of most recent runs to include
+        """
+        symbol = symbol.upper()
+        if symbol != "TOTAL" and "/" not in symbol:
+            symbol = f"{symbol}/USDT"
+        history = self.history.symbol_history(
+            symbol, columns=("USD_spent", "USD_value", "PnL"), last_n=last_n
+        )
+        if history.empty:
+            print(f"\nNo stored runs contain {symbol}")
+            return history
+        print(f"\n{symbol} over the last {len(history)} stored runs:")
+        print(history.to_string(index=False))
+        return history
+
+    def analyze_trades(self, trades_df=None, total_balance=None):
+        """
+        Main analysis function
 
-    def analyze_trades(self):
-        """Main analysis function"""
+        Args:
+            trades_df (DataFrame): Optional trades to analyze instead of the stored ones
+            total_balance (dict): Optional balances matching trades_df
+        """
         # Get trade data
-        trades_df, total_balance = self.binance.get_trades_analysis_data()
+        if trades_df is None or total_balance is None:
+            trades_df, total_balance = self.binance.get_trades_analysis_data()
+
+        # Reuse the previous result if none of the inputs changed
+        cached = self.load_run_cache(self.input_fingerprint(trades_df, total_balance))
+        self.unchanged = cached is not None
+        if self.unchanged:
+            print("\nInputs unchanged since last run, reusing previous results")
+            return cached
         
         # Get market data
         market_data = self.external.load_from_cache()
@@ -83,14 +108,11 @@ class Analysis:
         prices_dict = {coin["id"]: coin["current_price"] for coin in market_data}
         market_caps_dict = {coin["id"]: coin["market_cap"] for coin in market_data}
         fully_diluted_valuation = {coin["id"]: coin["fully_diluted_valuation"] for coin in market_data}
+        mcap_trend = self.external.archive.trend(days=30)
 
-        # Initialize output DataFrame
-        columns = [
-            "Pair", "#Tr", "USD_spent", "USD_value", "PnL", "pnl%",
-            "AvPr", "CrPr", "Pr_diff%", "BuyExtr$", "Expct T",
-            "Avlbl T", "USD_sell", f"MC{last_cache_update}", "Cohort"
-        ]
-        output_df = output_df_sold = pd.DataFrame(columns=columns)
+        # Collect open and sold position rows
+        rows, rows_sold = [], []
+        current_prices = {}
 
         # Process each trading pair
         grouped = trades_df.groupby("symbol")
@@ -106,7 +128,9 @@ class Analysis:
             
             # Check if we need to map this token
             coin_id = self.external.get_coin_id(coin_symbol)
-            if not coin_id:
+            if not coin_id and not self.interactive:
+                unmapped_tokens.add(coin_symbol.upper())
+            elif not coin_id:
                 print(f"\nToken {coin_symbol.upper()} not found in existing mappings")
                 coin_id = self.external.interactive_token_mapping(coin_symbol)
                 if coin_id:
@@ -115,7 +139,7 @@ class Analysis:
                     unmapped_tokens.add(coin_symbol.upper())
                 
             # Calculate trade metrics
-            num_trades = len(group)
+            num_trades = int((group["kind"] == "trade").sum())
             usd_spent_buy = group[group["side"] == "buy"]["cost"].sum()
             bought_tokens = group[group["side"] == "buy"]["amount"].sum()
             sell_tokens = group[group["side"] == "sell"]["amount"].sum()
@@ -129,14 +153,9 @@ class Analysis:
             raw_mcap = market_caps_dict.get(coin_id, 
                       fully_diluted_valuation.get(coin_id, 0))
             
-            # Calculate cohort from raw market cap
-            cohort = self.get_cohort(raw_mcap)
-            
-            # Format market cap for display
-            coin_cap = self.external.format_market_cap(raw_mcap)
-
             total_mcap = float(total_mcap) + float(market_caps_dict.get(coin_id, 0))
             current_usd_value = current_balance * current_price
+            current_prices[symbol] = current_price
 
             # Calculate average price
             if current_balance > 0 and (usd_spent_buy - usd_spent_sell) > 0:
@@ -147,15 +166,15 @@ class Analysis:
                 avpr = current_price
 
             # Calculate price difference and PnL
-            pricedf = int(((current_price - avpr) / avpr) * 100)
+            pricedf = ((current_price - avpr) / avpr) * 100
             if usd_spent_buy == 0:
                 usd_spent_buy = current_usd_value + usd_spent_sell
             pricedf_test = (current_usd_value + usd_spent_sell) * 100 / usd_spent_buy - 100
 
             # Calculate additional purchase recommendation
             adpch = (
-                (self.binance.additional_purchase(current_balance, avpr, current_price)
-                 * current_price * -1).astype(int)
+                float(self.binance.additional_purchase(current_balance, avpr, current_price)
+                      * current_price * -1)
                 if pricedf < 0 else -1
             )
 
@@ -163,33 +182,45 @@ class Analysis:
             new_row_data = {
                 "Pair": symbol,
                 "#Tr": num_trades,
-                "USD_spent": round(usd_spent_buy - usd_spent_sell, 1),
-                "USD_value": round(current_usd_value, 1),
-                "PnL": round((current_usd_value - usd_spent_buy + usd_spent_sell)),
-                "pnl%": f"{round(pricedf_test)}%",
-                "AvPr": round(avpr, 3),
-                "CrPr": round(current_price, 3),
-                "Pr_diff%": f"{round(pricedf)}%",
+                "USD_spent": usd_spent_buy - usd_spent_sell,
+                "USD_value": current_usd_value,
+                "PnL": current_usd_value - usd_spent_buy + usd_spent_sell,
+                "pnl%": pricedf_test,
+                "AvPr": avpr,
+                "CrPr": current_price,
+                "Pr_diff%": pricedf,
                 "BuyExtr$": adpch,
-                "Expct T": round(current_balance, 2),
-                "Avlbl T": round(actual_token_balance, 2),
-                "USD_sell": round(usd_spent_sell, 0),
-                f"MC{last_cache_update}": coin_cap,
-                "Cohort": cohort,
+                "Expct T": current_balance,
+                "Avlbl T": actual_token_balance,
+                "USD_sell": usd_spent_sell,
+                "MC": raw_mcap,
+                "MC 30d%": mcap_trend.get(coin_id, float("nan")),
             }
 
-            # Add to appropriate DataFrame
-            new_row = pd.DataFrame([new_row_data])
+            # Add to appropriate list, unknown market caps don't drop a row
+            if any(pd.isna(value) for key, value in new_row_data.items() if not key.startswith("MC")):
+                continue
             if current_balance > 0:
-                if not new_row.isna().all().any():
-                    output_df = pd.concat([output_df, new_row], ignore_index=True)
+                rows.append(new_row_data)
             else:
-                if not new_row.isna().all().any():
-                    output_df_sold = pd.concat([output_df_sold, new_row], ignore_index=True)
+                rows_sold.append(new_row_data)
 
         # Sort and combine results
+        output_df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
         output_df = output_df.sort_values("USD_value", ascending=False)
-        output_df = pd.concat([output_df, output_df_sold], ignore_index=True)
+        output_df = pd.concat(
+            [output_df, pd.DataFrame(rows_sold, columns=RESULT_COLUMNS)], ignore_index=True
+        )
+
+        # Classify all positions by market cap and summarize cohorts
+        output_df["Cohort"], self.cohort_summary = self.cohorts.analyze(output_df)
+
+        # Replay fills lot by lot for realized/unrealized PnL and holding periods
+        lot_pnl = self.cost_basis.analyze(
+            trades_df[trades_df["symbol"].isin(output_df["Pair"])], current_prices
+        ).set_index("Pair")
+        for column in ("Realized", "Unrealized", "Hold d"):
+            output_df[column] = output_df["Pair"].map(lot_pnl[column])
 
         # Calculate totals
         total_buy = output_df["USD_spent"].sum()
@@ -199,60 +230,115 @@ class Analysis:
         total_pl = output_df["PnL"].sum()
         total_diff_pnl = total_value * 100 / total_buy - 100 if total_buy != 0 else 0
 
-        # Add totals row
+        # Add totals row, columns without a total stay empty
         sums_df = pd.DataFrame([{
             "Pair": "TOTAL",
             "#Tr": total_trades,
-            "USD_spent": total_buy.round(1),
-            "USD_value": total_value.round(1),
+            "USD_spent": total_buy,
+            "USD_value": total_value,
             "PnL": total_pl,
-            "pnl%": f"{round(total_diff_pnl, 1)}%",
-            "AvPr": "---",
-            "CrPr": "---",
-            "Pr_diff%": "---",
-            "BuyExtr$": "---",
-            "Expct T": "---",
-            "Avlbl T": "---",
+            "pnl%": total_diff_pnl,
             "USD_sell": total_sell,
-            f"MC{last_cache_update}": "---",
-            "Cohort": "---",
-        }])
+            "Realized": output_df["Realized"].sum(),
+            "Unrealized": output_df["Unrealized"].sum(),
+        }], columns=RESULT_COLUMNS)
 
-        # Combine and calculate percentages
+        # Combine, enforce numeric types and calculate percentages
         output_df = pd.concat([sums_df, output_df], ignore_index=True)
-        output_df = self.calculate_percentages(output_df)
+        output_df[NUMERIC_COLUMNS] = output_df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors="coerce")
+        output_df = self.calculate_percentages(output_df)[RESULT_COLUMNS]
+        output_df.attrs["market_cache_updated"] = last_cache_update
+        self.history.record(output_df)
 
         # Update token mappings if new ones were found
         if new_mappings:
             print("\nUpdating token mappings with new entries...")
             self.external.update_token_mappings(new_mappings)
+            self.external.coin_ids.update(new_mappings)
         
         # Report unmapped tokens
+        self.unmapped_tokens = unmapped_tokens
         if unmapped_tokens:
             print("\nWarning: The following tokens were not found in cache:")
             print(", ".join(sorted(unmapped_tokens)))
             print("Please add them manually to tokens.py if needed")
 
-        return self.save_results(output_df)
+        results = self.save_results(output_df)
+        # Fingerprint again, the market cache may have been refreshed meanwhile
+        self.save_run_cache(self.input_fingerprint(trades_df, total_balance), results)
+        return results
+
+    def report_payload(self, results, history_runs=100):
+        """Everything the Google Sheets report publishes for these results"""
+        return {
+            "results": results,
+            "cohort_summary": self.cohort_summary,
+            "run_history": self.history.symbol_history(
+                "TOTAL", columns=("USD_spent", "USD_value", "PnL", "Realized", "Unrealized"),
+                last_n=history_runs
+            ),
+        }
+
+    def input_fingerprint(self, trades_df, total_balance):
+        """
+        Hash of every input the analysis result depends on
+
+        Covers the trades, market cache time, cost basis method, cohort
+        definitions, ignore list, token mappings and balances. Returns None
+        while the market cache is stale, since the analysis would refresh it
+        anyway.
+        """
+        cache_time = self.external.cache_timestamp()
+        if cache_time is None:
+            return None
+
+        sha = hashlib.sha256()
+        sha.update(pd.util.hash_pandas_object(trades_df, index=False).values.tobytes())
+        sha.update(str(cache_time).encode())
+        sha.update(self.cost_basis.method.encode())
+        sha.update(json.dumps([list(map(float, self.cohorts.thresholds)), list(self.cohorts.labels)]).encode())
+        sha.update(json.dumps(sorted(self.binance.pairs_to_skip)).encode())
+        sha.update(json.dumps(self.external.coin_ids, sort_keys=True).encode())
+        balances = {currency: amount for currency, amount in total_balance.items() if amount}
+        sha.update(json.dumps(balances, sort_keys=True, default=str).encode())
+        return sha.hexdigest()
+
+    def load_run_cache(self, fingerprint):
+        """Return the memoized result for fingerprint, or None"""
+        if fingerprint is None or not self.run_cache_file.exists():
+            return None
+        try:
+            with open(self.run_cache_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                return cached["results"]
+        except Exception as e:
+            print(f"Error loading run cache: {e}")
+        return None
+
+    def save_run_cache(self, fingerprint, results):
+        """Memoize results under fingerprint"""
+        if fingerprint is None:
+            return
+        try:
+            with open(self.run_cache_file, 'wb') as f:
+                pickle.dump({"fingerprint": fingerprint, "results": results}, f)
+        except Exception as e:
+            print(f"Error saving run cache: {e}")
 
     def save_results(self, output_df):
-        """Save analysis results and create backup"""
+        """Save analysis results, previous runs are kept in the snapshot history"""
         output_folder = "data"
-        filename = "binance_api_analysis.csv"
-        output_filename = os.path.join(output_folder, filename)
-        backup_folder = "backfiles"
-
-        # Create backup if file exists
-        if os.path.exists(output_filename):
-            current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-            if not os.path.exists(backup_folder):
-                os.makedirs(backup_folder)
-            backup_filename = os.path.join(backup_folder, f"{current_datetime}_{filename}")
-            os.rename(output_filename, backup_filename)
-            print(f"Backup created: {backup_filename}")
+        if self.binance.account:
+            output_folder = os.path.join(output_folder, self.binance.account)
+        os.makedirs(output_folder, exist_ok=True)
+        output_filename = os.path.join(output_folder, "binance_api_analysis.csv")
 
         # Save new results
         output_df.to_csv(output_filename, index=False)
+        if self.cohort_summary is not None:
+            self.cohort_summary.to_csv(os.path.join(output_folder, "cohort_summary.csv"), index=False)
+        self.cost_basis.open_lots.to_csv(os.path.join(output_folder, "open_lots.csv"), index=False)
         
         # Set display options for better output
         pd.set_option('display.max_rows', 1000)
@@ -263,7 +349,10 @@ class Analysis:
         # Print the results
         print("\nAnalysis Results:")
         print("=" * 100)
-        print(output_df)
+        print(format_report(output_df))
         print("=" * 100)
+        if self.cohort_summary is not None:
+            print("\nCohort Summary:")
+            print(self.cohort_summary.to_string(index=False))
         
         return output_df 
\ No newline at end of file
@@ -6,24 +6,50 @@ from dotenv import load_dotenv
 import os
 import json
 import time
+import ast
+import numpy as np
+from ohlcv_store import OHLCVStore
+from conversion_rates import ConversionRates, STABLE_ASSETS, FIAT_ASSETS
+from symbol_index import SymbolIndex
+from ledger import Ledger
+
+# Quote assets whose pairs are fetched for every held currency
+QUOTE_ASSETS = ["USDT", "BUSD", "FDUSD", "USDC", "TUSD", "BTC", "ETH", "BNB", "EUR"]
 
 class BinanceOperations:
-    def __init__(self):
+    def __init__(self, api_key=None, api_secret=None, account=None):
+        """
+        Args:
+            api_key (str): Binance API key, defaults to BINANCE_API_KEY from .env
+            api_secret (str): Binance secret, defaults to BINANCE_SECRET_KEY from .env
+            account (str): Optional account name; keeps its trades under Data/<account>
+        """
         # Load credentials
         env_path = Path(".") / ".env"
         load_dotenv(dotenv_path=env_path)
-        self.api_key = os.getenv("BINANCE_API_KEY")
-        self.api_secret = os.getenv("BINANCE_SECRET_KEY")
+        self.account = account
+        self.api_key = api_key or os.getenv("BINANCE_API_KEY")
+        self.api_secret = api_secret or os.getenv("BINANCE_SECRET_KEY")
         self.exchange = ccxt.binance({"apiKey": self.api_key, "secret": self.api_secret})
         
         # Setup cache directories
         self.cache_dir = Path("Cache")
-        self.data_dir = Path("Data")
+        self.data_dir = Path("Data") / account if account else Path("Data")
         self.cache_dir.mkdir(exist_ok=True)
-        self.data_dir.mkdir(exist_ok=True)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
         
         # Load pairs to skip
         self.pairs_to_skip = self.load_ignore_list()
+
+        # Cached USD rates of quote assets
+        self.quote_assets = QUOTE_ASSETS
+        self.rates = ConversionRates(OHLCVStore(self.exchange))
+
+        # Every pair ever traded, drives which pairs get polled
+        self.symbol_index = SymbolIndex(self.data_dir / "symbol_index.json")
+
+        # Deposits, withdrawals, Convert, Earn and airdrops, kept next to trades
+        self.ledger = Ledger(self.exchange, self.data_dir)
         
     def get_account_balance(self):
         """Get current account balance"""
@@ -47,7 +73,12 @@ class BinanceOperations:
         return balance
 
     def fetch_all_trades(self, start_date="2020-12-01"):
-        """Fetch all trades from Binance"""
+        """
+        Fetch new trades from Binance
+
+        Pairs come from the symbol index: active ones every run, dormant ones
+        on a slower schedule, plus listed pairs of held currencies not indexed yet.
+        """
         start_timestamp = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
         balance = self.get_account_balance()
         currencies = list(set(balance.keys()))
@@ -65,24 +96,35 @@ class BinanceOperations:
             all_trades = pd.DataFrame()
             last_timestamp = start_timestamp
 
-        # Fetch trades for each currency
-        for currency in currencies:
-            pair = f"{currency}/USDT"
-            if pair in self.pairs_to_skip:
-                continue
+        # Build the symbol index from stored trades on first use
+        if self.symbol_index.is_empty() and not all_trades.empty:
+            self.symbol_index.record_fills(self.last_fills(all_trades))
 
-            # Determine start timestamp for this currency
-            currency_trades = all_trades[all_trades["symbol"] == pair]
-            if not currency_trades.empty:
-                last_timestamp = currency_trades["timestamp"].max()
-            else:
-                last_timestamp = start_timestamp
+        # Poll active pairs, dormant pairs that are due and unseen pairs of held currencies
+        markets = self.exchange.load_markets()
+        active, dormant = self.symbol_index.due_pairs(balance)
+        probe = [
+            pair for pair in self.candidate_pairs(currencies, markets)
+            if pair not in self.symbol_index.entries
+        ]
+        pairs = [pair for pair in dict.fromkeys(active + dormant + probe) if not self.is_ignored(pair)]
+        print(f"Polling {len(active)} active, {len(dormant)} dormant and {len(probe)} new pairs...")
+
+        checked_at = int(time.time() * 1000)
+        new_trades = []
+        fetched = []
+        for pair in pairs:
+            # Continue from the last indexed fill of this pair
+            entry = self.symbol_index.entries.get(pair) or {}
+            last_timestamp = entry.get("last_trade") or start_timestamp
             
             # Fetch trades
             try:
                 trades = self.exchange.fetchMyTrades(pair, since=last_timestamp)
                 df = pd.DataFrame(trades)
                 all_trades = pd.concat([all_trades, df])
+                new_trades.append(df)
+                fetched.append(pair)
             except Exception as e:
                 print(f"Cannot fetch trades for symbol {pair}: {str(e)}")
 
@@ -91,18 +133,246 @@ class BinanceOperations:
         # Clean up and save trades
         if 'info' in all_trades.columns:
             all_trades.drop(columns=["info"], inplace=True)
-        all_trades.drop_duplicates(subset="datetime", keep="first", inplace=True)
+        all_trades = self.parse_fees(all_trades)
+        dedup_columns = "datetime"
+        if "id" in all_trades.columns:
+            # Stored IDs are read back as numbers, fresh ones are strings
+            all_trades["id"] = all_trades["id"].astype(str)
+            dedup_columns = ["symbol", "id"]
+        all_trades.drop_duplicates(subset=dedup_columns, keep="first", inplace=True)
         trades_file.parent.mkdir(exist_ok=True)
         all_trades.to_csv(trades_file, index=False)
 
+        self.update_conversion_rates(all_trades)
+
+        # Record pairs polled successfully and their newest fills, failed ones are retried next run
+        self.symbol_index.record_checked(fetched, checked_at)
+        new_trades = [df for df in new_trades if not df.empty]
+        if new_trades:
+            self.symbol_index.record_fills(self.last_fills(pd.concat(new_trades)))
+        self.symbol_index.save()
         return all_trades
 
+    def fetch_ledger(self):
+        """Fetch new non-trade balance movements and the rates to value them"""
+        print("Fetching deposits, withdrawals, Convert, Earn and airdrop history...")
+        self.ledger.update()
+        self.update_conversion_rates(self.ledger.load())
+
+    def last_fills(self, trades_df):
+        """Latest fill time and its USD price for every raw pair in trades_df"""
+        latest = trades_df.sort_values("timestamp").groupby("symbol").tail(1)
+        quotes = latest["symbol"].str.split("/").str[1].str.split(":").str[0]
+        rate = self.rates.to_usd(quotes.to_numpy(), latest["timestamp"].to_numpy())
+        price_usd = latest["price"].to_numpy(dtype=float) * rate
+        return {
+            pair: (int(timestamp), float(price))
+            for pair, timestamp, price in zip(latest["symbol"], latest["timestamp"], price_usd)
+        }
+
+    def is_ignored(self, pair):
+        """Ignore list entries name the USDT pair but stand for the asset"""
+        return f"{pair.split('/')[0]}/USDT" in self.pairs_to_skip
+
+    def candidate_pairs(self, currencies, markets):
+        """Listed pairs of each currency against the supported quote assets"""
+        pairs = []
+        for currency in currencies:
+            if self.is_ignored(f"{currency}/USDT"):
+                continue
+            for quote in self.quote_assets:
+                pair = f"{currency}/{quote}"
+                if currency != quote and pair in markets:
+                    pairs.append(pair)
+        return pairs
+
+    def parse_fees(self, trades_df):
+        """
+        Split ccxt fee dicts into fee_cost and fee_currency columns
+
+        Fresh trades carry dicts, trades read back from the CSV carry their
+        string form. Rows parsed before are left alone, and the raw fee
+        columns are dropped so the CSV only ever holds parsed fees.
+        """
+        if trades_df.empty:
+            return trades_df
+        trades_df = trades_df.reset_index(drop=True)
+        if "fee_cost" not in trades_df.columns:
+            trades_df["fee_cost"] = np.nan
+            trades_df["fee_currency"] = None
+        if "fee" in trades_df.columns:
+            def parse(fee):
+                if isinstance(fee, str):
+                    try:
+                        fee = ast.literal_eval(fee)
+                    except (ValueError, SyntaxError):
+                        return None
+                return fee if isinstance(fee, dict) else None
+
+            pending = trades_df["fee_cost"].isna() & trades_df["fee"].notna()
+            fees = trades_df.loc[pending, "fee"].map(parse)
+            trades_df.loc[pending, "fee_cost"] = fees.map(lambda fee: (fee or {}).get("cost"))
+            trades_df.loc[pending, "fee_currency"] = fees.map(lambda fee: (fee or {}).get("currency"))
+        trades_df["fee_cost"] = pd.to_numeric(trades_df["fee_cost"], errors="coerce").fillna(0.0)
+        return trades_df.drop(columns=["fee", "fees"], errors="ignore")
+
+    def update_conversion_rates(self, trades_df):
+        """
+        Bulk fetch missing USD rates for every quote and fee asset in the trades,
+        and for the base asset of rows without a price
+        """
+        if trades_df.empty:
+            return
+        parts = trades_df["symbol"].str.split("/", expand=True)
+        assets = parts[1].str.split(":").str[0].where(trades_df["price"].notna(), parts[0])
+        if "fee_currency" in trades_df.columns:
+            # Fees in the base asset are priced from the fill itself
+            fee_assets = trades_df["fee_currency"].where(
+                (trades_df["fee_cost"] > 0) & (trades_df["fee_currency"] != parts[0])
+            )
+            assets = pd.concat([assets, fee_assets])
+            timestamps = pd.concat([trades_df["timestamp"], trades_df["timestamp"]])
+        else:
+            timestamps = trades_df["timestamp"]
+        for asset in sorted(set(assets.dropna()) - STABLE_ASSETS):
+            since = int(timestamps[(assets == asset).to_numpy()].min())
+            print(f"Updating {asset} conversion rates...")
+            self.rates.update(asset, since)
+
+    def normalize_trades(self, trades_df):
+        """
+        Express every fill in USD on a <BASE>/USDT symbol
+
+        Cost and price are converted with the cached quote rates. Fees paid
+        in the base asset change the token amount: a buy receives less, a
+        sell gives up more. Fees in any other asset are converted and folded
+        into cost, added to what a buy cost and taken off what a sell
+        returned; when that asset is a crypto (quote, BNB, ...) a fee leg
+        selling it is added, since the fee leaves that position. Fills on
+        crypto quotes (e.g. ETH/BTC) also move the quote asset, so a mirrored
+        leg on <QUOTE>/USDT is added for them. Rows without a price
+        (deposits, withdrawals) are valued at the base asset's market rate.
+        """
+        parts = trades_df["symbol"].str.split("/", expand=True)
+        base, quote = parts[0], parts[1].str.split(":").str[0]
+        timestamps = trades_df["timestamp"].to_numpy()
+        rate = self.rates.to_usd(quote.to_numpy(), timestamps)
+
+        unpriced = trades_df["price"].isna().to_numpy()
+        if unpriced.any():
+            market = np.full(len(trades_df), np.nan)
+            market[unpriced] = self.rates.to_usd(base[unpriced].to_numpy(), timestamps[unpriced])
+            price = trades_df["price"].fillna(pd.Series(market / rate, index=trades_df.index))
+            trades_df = trades_df.assign(price=price, cost=trades_df["cost"].fillna(trades_df["amount"] * price))
+
+        missing = np.isnan(rate) | trades_df["price"].isna().to_numpy()
+        if missing.any():
+            pairs = ", ".join(sorted(trades_df.loc[missing, "symbol"].unique()))
+            print(f"Warning: no cached conversion rates for {missing.sum()} fills ({pairs})")
+
+        price_usd = trades_df["price"].to_numpy(dtype=float) * rate
+        fee_usd = self.fees_to_usd(trades_df, base, price_usd)
+        sign = np.where(trades_df["side"] == "buy", 1.0, -1.0)
+        if "fee_cost" in trades_df.columns:
+            fee_cost = trades_df["fee_cost"].fillna(0.0).to_numpy(dtype=float)
+            fee_currency = trades_df["fee_currency"].fillna("")
+        else:
+            fee_cost = np.zeros(len(trades_df))
+            fee_currency = pd.Series("", index=trades_df.index)
+        in_base = (fee_currency == base).to_numpy() & (fee_cost > 0)
+        charged_usd = np.where(in_base, 0.0, fee_usd)
+        trades_df = trades_df.assign(
+            symbol=base + "/USDT",
+            quote=quote,
+            quote_cost=trades_df["cost"],
+            gross_cost=trades_df["cost"] * rate,
+            amount=trades_df["amount"] - sign * np.where(in_base, fee_cost, 0.0),
+            price=price_usd,
+            cost=trades_df["cost"] * rate + sign * charged_usd,
+            fee_usd=fee_usd,
+            kind=trades_df["kind"].fillna("trade") if "kind" in trades_df.columns else "trade",
+        )
+
+        # Fees paid from another crypto position reduce that position
+        fee_leg = (charged_usd > 0) & ~fee_currency.isin(STABLE_ASSETS | FIAT_ASSETS).to_numpy()
+        if fee_leg.any():
+            fee_legs = trades_df[fee_leg].copy()
+            fee_legs["symbol"] = fee_currency[fee_leg] + "/USDT"
+            fee_legs["side"] = "sell"
+            fee_legs["amount"] = fee_cost[fee_leg]
+            fee_legs["price"] = charged_usd[fee_leg] / fee_cost[fee_leg]
+            fee_legs["cost"] = charged_usd[fee_leg]
+            fee_legs["fee_usd"] = 0.0
+            fee_legs["kind"] = "fee_leg"
+
+        crypto_quote = ~quote.isin(STABLE_ASSETS | FIAT_ASSETS)
+        if crypto_quote.any():
+            # The fee is charged to the base side only
+            legs = trades_df[crypto_quote].copy()
+            legs["symbol"] = legs["quote"] + "/USDT"
+            legs["side"] = np.where(legs["side"] == "buy", "sell", "buy")
+            legs["amount"] = legs["quote_cost"]
+            legs["price"] = rate[crypto_quote.to_numpy()]
+            legs["cost"] = legs["gross_cost"]
+            legs["fee_usd"] = 0.0
+            legs["kind"] = "quote_leg"
+            trades_df = pd.concat([trades_df, legs], ignore_index=True)
+        if fee_leg.any():
+            trades_df = pd.concat([trades_df, fee_legs], ignore_index=True)
+
+        return trades_df.drop(columns=["quote_cost", "gross_cost"])
+
+    def fees_to_usd(self, trades_df, base, price_usd):
+        """
+        USD value of every fill's fee
+
+        Fees in the base asset use the fill's own USD price; any other fee
+        asset (quote, BNB, ...) is joined against the cached rate table with
+        one lookup per distinct asset.
+
+        Args:
+            trades_df (DataFrame): Raw fills with fee_cost, fee_currency and timestamp
+            base (Series): Base asset per fill
+            price_usd (ndarray): USD price per fill
+        Returns:
+            ndarray: Fee in USD per fill, 0 where there is no fee
+        """
+        if "fee_cost" not in trades_df.columns:
+            return np.zeros(len(trades_df))
+        fee_cost = trades_df["fee_cost"].to_numpy(dtype=float)
+        currency = trades_df["fee_currency"].fillna("")
+        in_base = (currency == base).to_numpy()
+        paid = fee_cost > 0
+
+        fee_rate = self.rates.to_usd(
+            currency.where(paid & ~in_base, "").to_numpy(), trades_df["timestamp"].to_numpy()
+        )
+        fee_rate[in_base] = price_usd[in_base]
+
+        missing = paid & np.isnan(fee_rate)
+        if missing.any():
+            assets = ", ".join(sorted(currency[missing].unique()))
+            print(f"Warning: no cached rates for {missing.sum()} fees ({assets}), counting them as 0")
+        return np.where(paid & ~missing, fee_cost * fee_rate, 0.0)
+
+    def load_trades(self):
+        """Load stored trades and ledger movements prepared for analysis"""
+        trades_file = self.data_dir / "all_trades.csv"
+        trades_df = pd.read_csv(trades_file)
+        if "fee_cost" not in trades_df.columns:
+            # Older trade files keep raw ccxt fees, parse them once
+            trades_df = self.parse_fees(trades_df)
+            trades_df.to_csv(trades_file, index=False)
+            self.update_conversion_rates(trades_df)
+        ledger = self.ledger.load()
+        if not ledger.empty:
+            trades_df = pd.concat([trades_df.assign(kind="trade"), ledger], ignore_index=True)
+        return self.normalize_trades(trades_df)
+
     def get_trades_analysis_data(self):
         """Get current balance and trades data for analysis"""
         total_balance = self.exchange.fetch_balance()["total"]
-        trades_file = self.data_dir / "all_trades.csv"
-        trades_df = pd.read_csv(trades_file)
-        trades_df["symbol"] = trades_df["symbol"].str.replace("BUSD", "USDT")
+        trades_df = self.load_trades()
         
         return trades_df, total_balance
 
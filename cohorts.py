@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import json
+
+# Upper bounds of every cohort but the last, in USD
+DEFAULT_THRESHOLDS = [200e6, 2e9, 9e9]
+DEFAULT_LABELS = ["Tiny, <200m", "Small, 200m-2b", "Big, 2b-9b", "Huge, >9b"]
+UNKNOWN_COHORT = "Unknown"
+
+
+def short_cap(cap):
+    """Compact threshold label, e.g. 200000000 -> '200m', 2e9 -> '2b'"""
+    for divisor, suffix in ((1e12, "t"), (1e9, "b"), (1e6, "m"), (1e3, "k")):
+        if cap >= divisor:
+            return f"{cap / divisor:g}{suffix}"
+    return f"{cap:g}"
+
+
+class CohortEngine:
+    def __init__(self, config_file=Path("Cache") / "cohorts.json"):
+        """
+        Args:
+            config_file (Path): Optional JSON with custom cohort definitions, e.g.
+                {"thresholds": [50e6, 500e6, 5e9], "labels": ["Micro", "Small", "Mid", "Large"]}
+                Labels may be omitted and are then generated from the thresholds.
+        """
+        self.config_file = Path(config_file)
+        self.thresholds, self.labels = self.load_definitions()
+
+    def load_definitions(self):
+        """Load cohort thresholds and labels, falling back to the defaults"""
+        if not self.config_file.exists():
+            return np.array(DEFAULT_THRESHOLDS), list(DEFAULT_LABELS)
+        try:
+            with open(self.config_file, 'r') as f:
+                config = json.load(f)
+            thresholds = [float(value) for value in config["thresholds"]]
+            if not thresholds or thresholds != sorted(set(thresholds)):
+                raise ValueError("thresholds must be unique and ascending")
+
+            labels = config.get("labels")
+            if labels is None:
+                bounds = [short_cap(value) for value in thresholds]
+                labels = [f"<{bounds[0]}"]
+                labels += [f"{low}-{high}" for low, high in zip(bounds, bounds[1:])]
+                labels += [f">{bounds[-1]}"]
+            if len(labels) != len(thresholds) + 1:
+                raise ValueError("expected one more label than thresholds")
+            return np.array(thresholds), list(labels)
+        except Exception as e:
+            print(f"Error loading cohort definitions, using defaults: {e}")
+            return np.array(DEFAULT_THRESHOLDS), list(DEFAULT_LABELS)
+
+    def codes(self, caps):
+        """Cohort index of every market cap, len(labels) for unknown caps"""
+        caps = pd.to_numeric(pd.Series(caps), errors="coerce").to_numpy(dtype=float)
+        codes = np.searchsorted(self.thresholds, caps, side="right")
+        codes[np.isnan(caps)] = len(self.labels)
+        return codes
+
+    def classify(self, caps):
+        """Cohort label of every market cap"""
+        labels = np.array(self.labels + [UNKNOWN_COHORT], dtype=object)
+        return labels[self.codes(caps)]
+
+    def analyze(self, df, cap_column="MC"):
+        """
+        Classify all positions and summarize each cohort in one pass
+
+        Args:
+            df (DataFrame): Position rows with USD_spent, USD_value, PnL and cap_column
+        Returns:
+            tuple: (cohort label per row, summary DataFrame per cohort)
+        """
+        codes = self.codes(df[cap_column])
+        labels = np.array(self.labels + [UNKNOWN_COHORT], dtype=object)
+        size = len(labels)
+
+        summary = pd.DataFrame({
+            "Cohort": labels,
+            "Positions": np.bincount(codes, minlength=size),
+        })
+        for column in ("USD_spent", "USD_value", "PnL"):
+            weights = pd.to_numeric(df[column], errors="coerce").fillna(0).to_numpy(dtype=float)
+            summary[column] = np.bincount(codes, weights=weights, minlength=size).round(1)
+        for column in ("USD_spent", "USD_value"):
+            total = summary[column].sum()
+            summary[f"{column}%"] = (summary[column] / total * 100).round(1) if total else 0.0
+
+        summary = summary[summary["Positions"] > 0].reset_index(drop=True)
+        return labels[codes], summary
@@ -0,0 +1,234 @@
+from collections import Counter
+from pathlib import Path
+import pickle
+import json
+import time
+
+# Match tiers, lower is better
+EXACT_SYMBOL, EXACT_NAME, PREFIX, SUBSTRING, FUZZY = range(5)
+# Least trigram Jaccard similarity of a fuzzy match
+MIN_SIMILARITY = 0.3
+# Bumped when the pickled index layout changes
+INDEX_VERSION = 2
+# Queries shorter than a trigram are looked up by prefix
+MAX_PREFIX = 2
+
+
+class CoinSearch:
+    """
+    Ranked search over the full CoinGecko coin list
+
+    coins/list (every listed coin, not only the top ones by market cap) is
+    cached in coin_list.json and refreshed when older than max_age_days.
+    A trigram table over the words of symbols, ids and names, plus a table
+    of one and two letter word prefixes for shorter queries, is pickled next
+    to it and rebuilt only when the list changes, so a query only touches
+    the coins sharing enough trigrams with it. Coins that don't contain the query
+    still match when their trigrams are similar enough, so typos resolve.
+    """
+
+    def __init__(self, cg, cache_dir=Path("Cache"), max_age_days=7):
+        """
+        Args:
+            cg (CoinGeckoAPI): Client used to download the coin list
+            cache_dir (Path): Folder holding coin_list.json and coin_index.pkl
+            max_age_days (int): Age after which the coin list is downloaded again
+        """
+        self.cg = cg
+        self.list_file = Path(cache_dir) / "coin_list.json"
+        self.index_file = Path(cache_dir) / "coin_index.pkl"
+        self.max_age_days = max_age_days
+        self.index = None
+
+    def list_is_stale(self):
+        if not self.list_file.exists():
+            return True
+        return time.time() - self.list_file.stat().st_mtime > self.max_age_days * 86400
+
+    def refresh_list(self):
+        """Download coins/list, keeping the cached copy if that fails"""
+        try:
+            print("Fetching CoinGecko coin list...")
+            coins = self.cg.get_coins_list()
+        except Exception as e:
+            print(f"Error fetching coin list: {e}")
+            return False
+        self.list_file.parent.mkdir(exist_ok=True)
+        with open(self.list_file, 'w') as f:
+            json.dump(coins, f)
+        return True
+
+    def load_index(self):
+        """Index of the current coin list, refreshing the list and rebuilding as needed"""
+        if self.list_is_stale():
+            self.refresh_list()
+        if not self.list_file.exists():
+            return None
+
+        list_mtime = self.list_file.stat().st_mtime
+        if self.index is not None and self.index["list_mtime"] == list_mtime:
+            return self.index
+        try:
+            if self.index_file.exists():
+                with open(self.index_file, 'rb') as f:
+                    index = pickle.load(f)
+                if index.get("list_mtime") == list_mtime and index.get("version") == INDEX_VERSION:
+                    self.index = index
+                    return index
+        except Exception as e:
+            print(f"Error loading coin index: {e}")
+
+        with open(self.list_file, 'r') as f:
+            coins = json.load(f)
+        self.index = self.build_index(coins, list_mtime)
+        with open(self.index_file, 'wb') as f:
+            pickle.dump(self.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return self.index
+
+    @staticmethod
+    def coin_words(symbol, coin_id, name):
+        """Searchable words of a coin: symbol, id, name and their parts"""
+        return {symbol, coin_id, name, *coin_id.split("-"), *name.split()} - {""}
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def build_index(coins, list_mtime):
+        """
+        Prefix and trigram tables over the words of symbol, id and name
+
+        Returns:
+            dict: coins, symbol -> positions, prefix -> positions, the
+                  distinct words with their trigram counts and coin positions,
+                  trigram -> word numbers and the list mtime it was built from
+        """
+        symbols, prefixes, word_numbers = {}, {}, {}
+        word_coins, word_sizes, trigrams = [], [], {}
+        for position, coin in enumerate(coins):
+            symbol = coin.get("symbol", "").lower()
+            coin_id = coin.get("id", "").lower()
+            name = coin.get("name", "").lower()
+            symbols.setdefault(symbol, []).append(position)
+
+            for word in CoinSearch.coin_words(symbol, coin_id, name):
+                for length in range(1, min(len(word), MAX_PREFIX) + 1):
+                    prefixes.setdefault(word[:length], set()).add(position)
+                number = word_numbers.get(word)
+                if number is None:
+                    number = word_numbers[word] = len(word_coins)
+                    word_coins.append([])
+                    grams = CoinSearch.trigrams(word)
+                    word_sizes.append(len(grams))
+                    for gram in grams:
+                        trigrams.setdefault(gram, []).append(number)
+                word_coins[number].append(position)
+
+        return {
+            "version": INDEX_VERSION,
+            "list_mtime": list_mtime,
+            "coins": [(c.get("symbol", ""), c.get("id", ""), c.get("name", "")) for c in coins],
+            "symbols": symbols,
+            "prefixes": {key: sorted(value) for key, value in prefixes.items()},
+            "word_coins": word_coins,
+            "word_sizes": word_sizes,
+            "trigrams": trigrams,
+        }
+
+    def candidates(self, index, query):
+        """
+        Positions that can match the query, with their best trigram similarity
+
+        Short queries use the prefix table. Longer ones count the trigrams
+        every word shares with the query; words containing all of them (so
+        possibly the query itself) or reaching MIN_SIMILARITY (Jaccard)
+        bring in their coins.
+
+        Returns:
+            dict: position -> similarity
+        """
+        if len(query) <= MAX_PREFIX:
+            return dict.fromkeys(index["prefixes"].get(query, []), 0.0)
+        grams = self.trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(index["trigrams"].get(gram, []))
+
+        found = {}
+        for number, count in shared.items():
+            similarity = count / (len(grams) + index["word_sizes"][number] - count)
+            if count == len(grams) or similarity >= MIN_SIMILARITY:
+                for position in index["word_coins"][number]:
+                    if similarity > found.get(position, -1.0):
+                        found[position] = similarity
+        return found
+
+    def match_tier(self, query, symbol, coin_id, name, similarity):
+        """
+        Best tier of one coin for the query
+
+        Args:
+            similarity (float): Best trigram similarity of the coin's words
+        Returns:
+            int: Tier, None if the coin doesn't match
+        """
+        if symbol == query:
+            return EXACT_SYMBOL
+        if coin_id == query or name == query:
+            return EXACT_NAME
+        if any(word.startswith(query) for word in self.coin_words(symbol, coin_id, name)):
+            return PREFIX
+        if query in symbol or query in coin_id or query in name:
+            return SUBSTRING
+        if len(query) > MAX_PREFIX and similarity >= MIN_SIMILARITY:
+            return FUZZY
+        return None
+
+    def search(self, query, ranks=None, limit=25):
+        """
+        Coins matching a symbol, id or name, best matches first
+
+        Exact symbol matches come first, then exact ids or names, prefixes of
+        the symbol or any id/name word, plain substrings and finally fuzzy
+        matches by trigram similarity; ties go to the larger market cap.
+
+        Args:
+            query (str): Search text, case-insensitive
+            ranks (dict): coin id -> market cap rank, unknown coins rank last
+            limit (int): Maximum number of results, None for all
+        Returns:
+            list: Dicts with symbol, id, name and tier
+        """
+        index = self.load_index()
+        query = query.strip().lower()
+        if index is None or not query:
+            return []
+        ranks = ranks or {}
+
+        matches = []
+        for position, similarity in self.candidates(index, query).items():
+            symbol, coin_id, name = index["coins"][position]
+            tier = self.match_tier(query, symbol.lower(), coin_id.lower(), name.lower(), similarity)
+            if tier is not None:
+                # Within the fuzzy tier closer matches rank first
+                closeness = -similarity if tier == FUZZY else 0.0
+                matches.append((tier, closeness, ranks.get(coin_id, float("inf")), symbol.lower(), position))
+        matches.sort()
+
+        results = []
+        for tier, _, _, _, position in matches[:limit]:
+            symbol, coin_id, name = index["coins"][position]
+            results.append({"symbol": symbol.upper(), "id": coin_id, "name": name, "tier": tier})
+        return results
+
+    def exact_symbol(self, symbol, ranks=None):
+        """Every coin listed under exactly this symbol, largest market cap first"""
+        index = self.load_index()
+        if index is None:
+            return []
+        ranks = ranks or {}
+        positions = index["symbols"].get(symbol.lower(), [])
+        coins = [index["coins"][position] for position in positions]
+        coins.sort(key=lambda coin: ranks.get(coin[1], float("inf")))
+        return [{"symbol": s.upper(), "id": coin_id, "name": name} for s, coin_id, name in coins]
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Quotes worth one USD, and fiat quotes treated as cash rather than positions
+STABLE_ASSETS = {"USDT", "BUSD", "FDUSD", "USDC", "TUSD", "USDP", "DAI"}
+FIAT_ASSETS = {"EUR", "GBP", "TRY", "BRL", "AUD", "RUB", "UAH"}
+
+
+class ConversionRates:
+    """
+    USD conversion rates of quote assets, read from the local candle store
+
+    Rates are hourly closes of <asset>/USDT fetched in bulk into the
+    OHLCVStore; lookups only read the memory-mapped cache, never the network.
+    """
+
+    def __init__(self, store, timeframe="1h"):
+        """
+        Args:
+            store (OHLCVStore): Candle cache used as the rate table
+            timeframe (str): Candle timeframe of the rate table
+        """
+        self.store = store
+        self.timeframe = timeframe
+
+    def update(self, asset, since):
+        """Fill the rate table of an asset from since (ms) to now, backfilling older candles"""
+        if asset in STABLE_ASSETS:
+            return 0
+        return self.store.update(f"{asset}/USDT", since, self.timeframe)
+
+    def rates(self, asset, timestamps):
+        """
+        USD rate of an asset at each timestamp
+
+        Uses the last cached close at or before each time; update() backfills
+        the table, so times it doesn't cover are left NaN rather than priced
+        from another period.
+
+        Returns:
+            ndarray: Rate per timestamp, NaN where no cached candle covers it
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if asset in STABLE_ASSETS:
+            return np.ones(len(timestamps))
+        return self.store.closes_asof(f"{asset}/USDT", timestamps, self.timeframe)
+
+    def to_usd(self, assets, timestamps):
+        """
+        USD rate for every (asset, timestamp) pair, one lookup per distinct asset
+
+        Args:
+            assets (array): Asset code per row
+            timestamps (array): Time in ms per row
+        Returns:
+            ndarray: Rate per row
+        """
+        assets = pd.Series(assets).fillna("").to_numpy(dtype=str)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        result = np.full(len(assets), np.nan)
+        for asset in np.unique(assets):
+            if not asset:
+                continue
+            rows = np.flatnonzero(assets == asset)
+            result[rows] = self.rates(asset, timestamps[rows])
+        return result
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import time
+
+METHODS = {"fifo": 0, "lifo": 1, "average": 2}
+MS_PER_DAY = 86400 * 1000
+EPSILON = 1e-12
+
+
+def replay_fills(is_buy, amount, unit_cost, timestamp, method):
+    """
+    Replay one symbol's fills in timestamp order against a lot book
+
+    Written with scalar operations on NumPy arrays only, so it can be
+    compiled with numba.njit unchanged.
+
+    Args:
+        is_buy (ndarray): True for buys, False for sells
+        amount (ndarray): Token amount per fill
+        unit_cost (ndarray): USD per token, cost for buys and proceeds for sells
+        timestamp (ndarray): Fill time in ms (int64)
+        method (int): 0 FIFO, 1 LIFO, 2 average cost
+    Returns:
+        tuple: (realized PnL, unmatched sell amount, closed amount,
+                closed amount * holding ms, open lot amounts, prices, times)
+    """
+    n = amount.shape[0]
+    lot_amount = np.zeros(n)
+    lot_price = np.zeros(n)
+    lot_time = np.zeros(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    realized = 0.0
+    unmatched = 0.0
+    closed = 0.0
+    held = 0.0
+
+    for i in range(n):
+        qty = amount[i]
+        if is_buy[i]:
+            if method == 2 and tail > head:
+                # Average cost keeps a single pooled lot
+                total = lot_amount[head] + qty
+                lot_price[head] = (lot_amount[head] * lot_price[head] + qty * unit_cost[i]) / total
+                lot_time[head] = np.int64((lot_amount[head] * lot_time[head] + qty * timestamp[i]) / total)
+                lot_amount[head] = total
+            else:
+                lot_amount[tail] = qty
+                lot_price[tail] = unit_cost[i]
+                lot_time[tail] = timestamp[i]
+                tail += 1
+            continue
+
+        while qty > EPSILON and tail > head:
+            j = tail - 1 if method == 1 else head
+            take = min(qty, lot_amount[j])
+            realized += take * (unit_cost[i] - lot_price[j])
+            closed += take
+            held += take * (timestamp[i] - lot_time[j])
+            lot_amount[j] -= take
+            qty -= take
+            if lot_amount[j] <= EPSILON:
+                if method == 1:
+                    tail -= 1
+                else:
+                    head += 1
+        if qty > EPSILON:
+            unmatched += qty
+
+    return (realized, unmatched, closed, held,
+            lot_amount[head:tail], lot_price[head:tail], lot_time[head:tail])
+
+
+class CostBasis:
+    def __init__(self, method="fifo"):
+        """
+        Args:
+            method (str): Lot matching method, one of 'fifo', 'lifo', 'average'
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown cost basis method '{method}', expected one of {', '.join(METHODS)}")
+        self.method = method
+        self.open_lots = pd.DataFrame()
+
+    def fill_arrays(self, trades_df):
+        """Sorted per-fill arrays and symbol boundaries for the replay
+
+        Costs already include fees, so unit costs are fee-adjusted buy prices
+        and net sell proceeds.
+        """
+        trades = trades_df.sort_values(["symbol", "timestamp"], kind="stable")
+        amount = trades["amount"].to_numpy(dtype=float)
+        cost = trades["cost"].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            unit_cost = np.where(amount > 0, cost / amount, 0.0)
+        symbols = trades["symbol"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]]) if len(symbols) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(symbols)]
+        return {
+            "symbols": symbols,
+            "is_buy": trades["side"].to_numpy() == "buy",
+            "amount": amount,
+            "unit_cost": unit_cost,
+            "timestamp": trades["timestamp"].to_numpy(dtype=np.int64),
+            "bounds": list(zip(starts, ends)),
+        }
+
+    def analyze(self, trades_df, current_prices, now=None):
+        """
+        Realized and unrealized PnL plus holding periods for every symbol
+
+        Args:
+            trades_df (DataFrame): Fills with symbol, side, amount, cost, timestamp
+            current_prices (dict): Current USD price per symbol
+            now (float): Reference time in seconds for open lot ages, defaults to now
+        Returns:
+            DataFrame: One row per symbol; open lots are kept in self.open_lots
+        """
+        now_ms = int((now or time.time()) * 1000)
+        fills = self.fill_arrays(trades_df)
+        method = METHODS[self.method]
+
+        rows = []
+        lots = []
+        for start, end in fills["bounds"]:
+            symbol = fills["symbols"][start]
+            realized, unmatched, closed, held, lot_amount, lot_price, lot_time = replay_fills(
+                fills["is_buy"][start:end], fills["amount"][start:end],
+                fills["unit_cost"][start:end], fills["timestamp"][start:end], method
+            )
+            open_amount = lot_amount.sum()
+            open_cost = (lot_amount * lot_price).sum()
+            price = current_prices.get(symbol, 0) or 0
+            ages = (now_ms - lot_time) / MS_PER_DAY
+            rows.append({
+                "Pair": symbol,
+                "Realized": realized,
+                "Unrealized": open_amount * price - open_cost,
+                "Open T": open_amount,
+                "Open cost": open_cost,
+                "Hold d": held / closed / MS_PER_DAY if closed else np.nan,
+                "Age d": (lot_amount * ages).sum() / open_amount if open_amount > EPSILON else np.nan,
+                "Unmatched T": unmatched,
+            })
+            if len(lot_amount):
+                lots.append(pd.DataFrame({
+                    "Pair": symbol,
+                    "amount": lot_amount,
+                    "price": lot_price,
+                    "opened": pd.to_datetime(lot_time, unit="ms"),
+                    "age_days": ages.round(1),
+                }))
+
+        self.open_lots = pd.concat(lots, ignore_index=True) if lots else pd.DataFrame(
+            columns=["Pair", "amount", "price", "opened", "age_days"]
+        )
+        return pd.DataFrame(rows, columns=[
+            "Pair", "Realized", "Unrealized", "Open T", "Open cost", "Hold d", "Age d", "Unmatched T"
+        ])
@@ -5,14 +5,23 @@ import json
 import time
 import os
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 from pathlib import Path
 import logging
+from presentation import format_market_cap
+from market_archive import MarketArchive
+from coin_search import CoinSearch
 
 logger = logging.getLogger(__name__)
 
 class ExternalServices:
-    def __init__(self):
+    def __init__(self, connect_google=True):
+        """
+        Args:
+            connect_google (bool): If False, skips Google Sheets authorization
+                (used by worker processes that never upload)
+        """
         # Initialize CoinGecko
         self.cg = CoinGeckoAPI()
         # Update cache path to use Cache folder
@@ -22,12 +31,15 @@ class ExternalServices:
         
         # Ensure Cache directory exists
         self.cache_dir.mkdir(exist_ok=True)
+        self.archive = MarketArchive(self.cache_dir / "market_archive")
+        self.coin_search = CoinSearch(self.cg, self.cache_dir)
         
         # Load token mappings
         self.coin_ids = self.load_token_mappings()
         
         # Setup Google credentials
-        self.setup_google_credentials()
+        if connect_google:
+            self.setup_google_credentials()
         
     def setup_google_credentials(self):
         """Setup Google Sheets credentials"""
@@ -95,10 +107,11 @@ class ExternalServices:
         for entry in all_data:
             entry['_timestamp'] = current_time
 
-        # Save to cache
+        # Save to cache and keep the snapshot in the archive
         self.cache_dir.mkdir(exist_ok=True)
         with open(self.cache_file, 'w') as f:
             json.dump(all_data, f)
+        self.archive.append(all_data, current_time)
 
         return all_data
         
@@ -112,70 +125,108 @@ class ExternalServices:
                 if data and '_timestamp' in data[0]:
                     cache_age = current_time - data[0]['_timestamp']
                     if cache_age < self.max_cache_hours * 3600:
+                        # Seed the archive with a cache older than it
+                        if self.archive.is_empty():
+                            self.archive.append(data)
                         return data
         
         return self.update_coingecko_cache()
         
-    def upload_to_google_sheets(self, df):
-        """Upload analysis results to Google Sheets"""
+    def cache_timestamp(self):
+        """Modification time of the market cache, or None if missing or stale"""
+        if not os.path.exists(self.cache_file):
+            return None
+        modified = os.path.getmtime(self.cache_file)
+        if time.time() - modified >= self.max_cache_hours * 3600:
+            return None
+        return modified
+
+    def upload_to_google_sheets(self, results, cohort_summary=None, run_history=None):
+        """
+        Publish the report tabs to Google Sheets in one batchUpdate request
+
+        Open positions (with the TOTAL row), closed positions, the cohort
+        summary and the run history each get their own tab, created on
+        demand. Cells are written as typed values so the sheet can sort and
+        chart them.
+
+        Args:
+            results (DataFrame): Numeric results from Analysis.analyze_trades
+            cohort_summary (DataFrame): Optional cohort summary
+            run_history (DataFrame): Optional TOTAL row over recent runs
+        """
         try:
-            # Open the spreadsheet
             doc = self.client.open_by_url(os.getenv("GOOGLE_SHEET_URL"))
-            worksheet = doc.get_worksheet(0)
-            
-            # Get existing data
-            existing_data = worksheet.get_all_values()
-            
-            # Update values in existing data
-            df = df.iloc[:-1]  # Remove the last row (usually totals)
-            df = df.fillna(0)
-            
-            for index, row in df.iterrows():
-                symbol = row["Pair"]
-                matching_row_index = next(
-                    (i for i, existing_row in enumerate(existing_data) 
-                     if existing_row[0] == symbol), None
-                )
-                
-                if matching_row_index is not None:
-                    existing_row = existing_data[matching_row_index]
-                    for col_name in df.columns[1:]:
-                        if str(row[col_name]) != existing_row[df.columns.get_loc(col_name)]:
-                            existing_row[df.columns.get_loc(col_name)] = row[col_name]
+
+            updated = results.attrs.get("market_cache_updated")
+            results = results.rename(columns={"MC": f"MC{updated}"}) if updated else results
+            is_open = (results["Pair"] == "TOTAL") | (results["Expct T"] > 0)
+            tabs = {
+                "Positions": results[is_open],
+                "Closed": results[~is_open],
+            }
+            if cohort_summary is not None:
+                tabs["Cohorts"] = cohort_summary
+            if run_history is not None:
+                tabs["History"] = run_history
+
+            # One metadata read to find existing tabs, then a single write
+            sheets = doc.fetch_sheet_metadata()["sheets"]
+            sheet_ids = {sheet["properties"]["title"]: sheet["properties"]["sheetId"] for sheet in sheets}
+            next_id = max(sheet_ids.values(), default=0) + 1
+
+            requests = []
+            for title, table in tabs.items():
+                grid = {"rowCount": len(table) + 1, "columnCount": max(len(table.columns), 1)}
+                sheet_id = sheet_ids.get(title)
+                if sheet_id is None:
+                    sheet_id = next_id
+                    next_id += 1
+                    requests.append({"addSheet": {"properties": {
+                        "sheetId": sheet_id, "title": title, "gridProperties": grid
+                    }}})
                 else:
-                    new_row = [str(row[col_name]) for col_name in df.columns]
-                    existing_data.append(new_row)
-            
-            # Update the sheet
-            worksheet.update("A1", existing_data)
-            
-            # Update header
-            new_header = df.columns.tolist()
-            header_update = [new_header]
-            worksheet.update(
-                'A1:' + chr(64+len(new_header)) + '1', 
-                header_update
-            )
-            
-            print("Data updated in Google Sheets.")
-            
+                    requests.append({"updateSheetProperties": {
+                        "properties": {"sheetId": sheet_id, "gridProperties": grid},
+                        "fields": "gridProperties.rowCount,gridProperties.columnCount",
+                    }})
+                    requests.append({"updateCells": {
+                        "range": {"sheetId": sheet_id}, "fields": "userEnteredValue"
+                    }})
+                requests.append({"updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                    "rows": self.sheet_rows(table),
+                    "fields": "userEnteredValue",
+                }})
+
+            doc.batch_update({"requests": requests})
+            print(f"Data updated in Google Sheets ({', '.join(tabs)}).")
+
         except Exception as e:
             logger.error(f"Error uploading to Google Sheets: {e}")
             raise
-            
+
+    def sheet_rows(self, table):
+        """Convert a DataFrame with its header into Sheets API row data"""
+        def cell(value):
+            if isinstance(value, (bool, np.bool_)):
+                return {"userEnteredValue": {"boolValue": bool(value)}}
+            if isinstance(value, (int, float, np.integer, np.floating)):
+                if pd.isna(value):
+                    return {}
+                return {"userEnteredValue": {"numberValue": float(value)}}
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                return {}
+            return {"userEnteredValue": {"stringValue": str(value)}}
+
+        rows = [{"values": [cell(str(column)) for column in table.columns]}]
+        for record in table.itertuples(index=False):
+            rows.append({"values": [cell(value) for value in record]})
+        return rows
+
     def format_market_cap(self, cap):
         """Format market cap into human readable string"""
-        try:
-            cap = float(cap)
-        except (ValueError, TypeError):
-            return "0"
-            
-        if cap >= 1e9:
-            return f"{cap/1e9:.1f}B"
-        elif cap >= 1e6:
-            return f"{cap/1e6:.1f}M"
-        else:
-            return f"{cap:.1f}"
+        return format_market_cap(cap)
 
     def get_market_data(self, coin_id):
         """Get market data from CoinGecko"""
@@ -187,54 +238,53 @@ class ExternalServices:
         Inspect the contents of the CoinGecko cache
         
         Args:
-            search_token (str): Optional token symbol to search for
+            search_token (str): Optional symbol, id or name to search the full coin list for
         """
+        data = []
         if os.path.exists(self.cache_file):
             with open(self.cache_file, 'r') as f:
                 data = json.load(f)
-                if data and '_timestamp' in data[0]:
-                    cache_time = datetime.fromtimestamp(data[0]['_timestamp'])
-                    print(f"\nCache last updated: {cache_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                    print(f"Total coins in cache: {len(data)}")
-                    
-                    # Create a sorted list of coins with their details
-                    coin_list = []
-                    for coin in data:
-                        coin_list.append({
-                            'symbol': coin.get('symbol', '').upper(),
-                            'id': coin.get('id', ''),
-                            'market_cap': self.format_market_cap(coin.get('market_cap', 0)),
-                            'price': coin.get('current_price', 0),
-                            'name': coin.get('name', '')
-                        })
-                    
-                    # Filter by search token if provided
-                    if search_token:
-                        search_term = search_token.upper()
-                        coin_list = [
-                            coin for coin in coin_list 
-                            if search_term in coin['symbol'].upper() 
-                            or search_term in coin['id'].upper()
-                            or search_term in coin['name'].upper()
-                        ]
-                        if not coin_list:
-                            print(f"\nNo matches found for '{search_token}'")
-                            return None
-                        print(f"\nFound {len(coin_list)} matches for '{search_token}':")
-                    
-                    # Sort by symbol
-                    coin_list.sort(key=lambda x: x['symbol'])
-                    
-                    print("\nCached coins:")
-                    print("=" * 100)
-                    print(f"{'Symbol':<10} {'Name':<20} {'ID':<25} {'Market Cap':<15} {'Price':<10}")
-                    print("-" * 100)
-                    for coin in coin_list:
-                        print(f"{coin['symbol']:<10} {coin['name'][:18]:<20} {coin['id']:<25} {coin['market_cap']:<15} {coin['price']:<10}")
-                    print("=" * 100)
-                    return data
-        print("\nNo cache file found or cache is empty")
-        return None 
+        if data and '_timestamp' in data[0]:
+            cache_time = datetime.fromtimestamp(data[0]['_timestamp'])
+            print(f"\nCache last updated: {cache_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"Total coins in cache: {len(data)}")
+        elif not search_token:
+            print("\nNo cache file found or cache is empty")
+            return None
+        markets = {coin.get('id'): coin for coin in data}
+
+        if search_token:
+            # Ranked matches from the full coin list, market data where cached
+            matches = self.coin_search.search(search_token, ranks=self.market_ranks(data))
+            if not matches:
+                print(f"\nNo matches found for '{search_token}'")
+                return None
+            print(f"\nFound {len(matches)} matches for '{search_token}':")
+        else:
+            matches = sorted(
+                ({'symbol': coin.get('symbol', '').upper(), 'id': coin.get('id', ''), 'name': coin.get('name', '')}
+                 for coin in data),
+                key=lambda x: x['symbol']
+            )
+
+        print("\nCached coins:")
+        print("=" * 100)
+        print(f"{'Symbol':<10} {'Name':<20} {'ID':<25} {'Market Cap':<15} {'Price':<10}")
+        print("-" * 100)
+        for coin in matches:
+            market = markets.get(coin['id'], {})
+            market_cap = self.format_market_cap(market.get('market_cap', 0)) if market else "-"
+            price = market.get('current_price', 0) if market else "-"
+            print(f"{coin['symbol']:<10} {coin['name'][:18]:<20} {coin['id']:<25} {market_cap:<15} {price:<10}")
+        print("=" * 100)
+        return data
+
+    def market_ranks(self, market_data):
+        """Coin id -> market cap rank of the cached market data"""
+        return {
+            coin.get('id'): coin.get('market_cap_rank') or float("inf")
+            for coin in market_data
+        }
 
     def interactive_token_mapping(self, symbol):
         """
@@ -249,16 +299,28 @@ class ExternalServices:
         search_term = symbol.upper()
         exact_matches = []
         
-        # Search in cache for exact symbol matches
+        # Exact symbol matches from the full coin list, largest market cap first
         cache_data = self.load_from_cache()
-        for coin in cache_data:
-            if coin.get('symbol', '').upper() == search_term:
-                exact_matches.append({
-                    'symbol': coin.get('symbol', '').upper(),
-                    'name': coin.get('name', ''),
-                    'id': coin.get('id', ''),
-                    'market_cap': self.format_market_cap(coin.get('market_cap', 0))
-                })
+        markets = {coin.get('id'): coin for coin in cache_data}
+        for coin in self.coin_search.exact_symbol(search_term, ranks=self.market_ranks(cache_data)):
+            market = markets.get(coin['id'])
+            exact_matches.append({
+                'symbol': coin['symbol'],
+                'name': coin['name'],
+                'id': coin['id'],
+                'market_cap': self.format_market_cap(market.get('market_cap', 0)) if market else "-"
+            })
+
+        # Fall back to the market cache if the coin list is unavailable
+        if not exact_matches:
+            for coin in cache_data:
+                if coin.get('symbol', '').upper() == search_term:
+                    exact_matches.append({
+                        'symbol': coin.get('symbol', '').upper(),
+                        'name': coin.get('name', ''),
+                        'id': coin.get('id', ''),
+                        'market_cap': self.format_market_cap(coin.get('market_cap', 0))
+                    })
         
         # If no exact matches found
         if not exact_matches:
@@ -0,0 +1,270 @@
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+import json
+import time
+from conversion_rates import STABLE_ASSETS, FIAT_ASSETS
+
+DAY_MS = 86400 * 1000
+# Same columns as all_trades.csv plus the kind of movement
+LEDGER_COLUMNS = [
+    "id", "timestamp", "datetime", "symbol", "side", "amount", "price", "cost",
+    "fee_cost", "fee_currency", "kind",
+]
+CASH_ASSETS = STABLE_ASSETS | FIAT_ASSETS
+
+
+class Ledger:
+    """
+    Non-trade balance movements: deposits, withdrawals, Convert, Earn rewards, airdrops
+
+    Every source is paged through in fixed time windows from its watermark
+    in ledger_state.json, so history is downloaded once and later runs only
+    fetch what is new. Rows are appended to ledger.csv in the trades schema:
+      - deposits and withdrawals are buys/sells on <ASSET>/USDT without a
+        price; they are valued at the market rate when loaded
+      - Earn rewards and airdrops are zero-cost buys
+      - Convert orders are fills on <TO>/<FROM>, exactly like a spot trade
+    Cash assets (stablecoins, fiat) are left out, like in the trade analysis.
+    """
+
+    def __init__(self, exchange, data_dir=Path("Data"), start_date="2020-12-01", overlap_days=1):
+        """
+        Args:
+            exchange: ccxt Binance exchange
+            data_dir (Path): Folder holding ledger.csv and ledger_state.json
+            start_date (str): Earliest date fetched on the first run
+            overlap_days (int): Days re-read before each watermark to catch late records
+        """
+        self.exchange = exchange
+        self.ledger_file = Path(data_dir) / "ledger.csv"
+        self.state_file = Path(data_dir) / "ledger_state.json"
+        self.start_timestamp = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
+        self.overlap_ms = overlap_days * DAY_MS
+        self.state = self.load_state()
+
+    def sources(self):
+        """Source name -> (fetch function for a time window, window size in days)"""
+        return {
+            "deposit": (self.fetch_deposits, 89),
+            "withdrawal": (self.fetch_withdrawals, 89),
+            "convert": (self.fetch_converts, 29),
+            "earn": (self.fetch_earn_rewards, 89),
+            "airdrop": (self.fetch_airdrops, 89),
+        }
+
+    def load_state(self):
+        """Load per-source watermarks, empty if missing"""
+        try:
+            if self.state_file.exists():
+                with open(self.state_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading ledger state: {e}")
+        return {}
+
+    def save_state(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_file, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+
+    def known_ids(self):
+        """(kind, id) of every stored row, used to skip re-read records"""
+        if not self.ledger_file.exists():
+            return set()
+        stored = pd.read_csv(self.ledger_file, usecols=["kind", "id"], dtype={"id": str})
+        return set(zip(stored["kind"], stored["id"]))
+
+    def update(self):
+        """
+        Fetch every source from its watermark up to now
+
+        Returns:
+            int: Number of new ledger rows
+        """
+        known = self.known_ids()
+        added = 0
+        for source, (fetch, window_days) in self.sources().items():
+            added += self.update_source(source, fetch, window_days * DAY_MS, known)
+        return added
+
+    def update_source(self, source, fetch, window_ms, known):
+        """
+        Page one source window by window, storing rows and the watermark after each
+
+        A failing window stops the source; the next run resumes from there.
+        """
+        watermark = self.state.get(source, self.start_timestamp)
+        start = max(self.start_timestamp, watermark - self.overlap_ms)
+        now_ms = int(time.time() * 1000)
+        added = 0
+
+        while start < now_ms:
+            end = min(start + window_ms, now_ms)
+            try:
+                rows = fetch(start, end)
+            except Exception as e:
+                print(f"Cannot fetch {source} history: {e}")
+                break
+
+            rows = [row for row in rows if (row["kind"], row["id"]) not in known]
+            self.append(rows)
+            known.update((row["kind"], row["id"]) for row in rows)
+            added += len(rows)
+            self.state[source] = end
+            self.save_state()
+            start = end
+            time.sleep(0.3)  # Rate limiting
+
+        if added:
+            print(f"Stored {added} new {source} records")
+        return added
+
+    def append(self, rows):
+        """Append rows to ledger.csv, writing the header for a new file"""
+        if not rows:
+            return
+        self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+        frame = pd.DataFrame(rows, columns=LEDGER_COLUMNS)
+        frame.to_csv(self.ledger_file, mode="a", index=False, header=not self.ledger_file.exists())
+
+    def load(self):
+        """Stored ledger rows, empty with the ledger columns if nothing is stored"""
+        if not self.ledger_file.exists():
+            return pd.DataFrame(columns=LEDGER_COLUMNS)
+        ledger = pd.read_csv(self.ledger_file, dtype={"id": str})
+        # Cash to cash converts stored by earlier versions aren't positions
+        assets = ledger["symbol"].str.split("/", expand=True)
+        cash = assets[0].isin(CASH_ASSETS) & assets[1].isin(CASH_ASSETS)
+        return ledger[~cash].drop_duplicates(subset=["kind", "id"], keep="first")
+
+    @staticmethod
+    def row(kind, record_id, timestamp, symbol, side, amount, price=None, cost=None,
+            fee_cost=0.0, fee_currency=None):
+        """One ledger row in the trades schema"""
+        return {
+            "id": str(record_id),
+            "timestamp": int(timestamp),
+            "datetime": pd.to_datetime(int(timestamp), unit="ms").isoformat(),
+            "symbol": symbol,
+            "side": side,
+            "amount": float(amount),
+            "price": price,
+            "cost": cost,
+            "fee_cost": fee_cost or 0.0,
+            "fee_currency": fee_currency,
+            "kind": kind,
+        }
+
+    @staticmethod
+    def walk_back(request, end, limit, time_field):
+        """
+        Collect a newest-first endpoint that returns at most limit records per call
+
+        Full pages are followed by a request ending just before the oldest
+        record seen; ids are deduplicated by the caller.
+        """
+        records = []
+        while True:
+            page = request(end)
+            records.extend(page)
+            if len(page) < limit:
+                return records
+            end = min(int(record[time_field]) for record in page) - 1
+            time.sleep(0.3)
+
+    def transfer_rows(self, transfers, kind, side):
+        """Completed non-cash ccxt transfers as unpriced rows"""
+        rows = []
+        for transfer in transfers:
+            currency = transfer.get("currency")
+            if transfer.get("status") != "ok" or not currency or currency in CASH_ASSETS:
+                continue
+            fee = transfer.get("fee") or {}
+            rows.append(self.row(
+                kind, transfer["id"], transfer["timestamp"], f"{currency}/USDT", side,
+                transfer["amount"], fee_cost=fee.get("cost"), fee_currency=fee.get("currency"),
+            ))
+        return rows
+
+    def fetch_deposits(self, start, end):
+        deposits = self.exchange.fetch_deposits(since=start, params={"endTime": end})
+        return self.transfer_rows(deposits, "deposit", "buy")
+
+    def fetch_withdrawals(self, start, end):
+        withdrawals = self.exchange.fetch_withdrawals(since=start, params={"endTime": end})
+        return self.transfer_rows(withdrawals, "withdrawal", "sell")
+
+    def fetch_converts(self, start, end):
+        """Accepted Convert orders as trades on <TO>/<FROM>, or <FROM>/<TO> when selling into cash"""
+        orders = self.walk_back(
+            lambda window_end: self.exchange.sapiGetConvertTradeFlow(
+                {"startTime": start, "endTime": window_end, "limit": 1000}
+            ).get("list", []),
+            end, 1000, "createTime",
+        )
+        rows = []
+        for order in orders:
+            if order.get("orderStatus") != "SUCCESS":
+                continue
+            from_asset, to_asset = order["fromAsset"], order["toAsset"]
+            if from_asset in CASH_ASSETS and to_asset in CASH_ASSETS:
+                continue
+            from_amount, to_amount = float(order["fromAmount"]), float(order["toAmount"])
+            if to_asset in CASH_ASSETS and from_asset not in CASH_ASSETS:
+                rows.append(self.row(
+                    "convert", order["orderId"], order["createTime"], f"{from_asset}/{to_asset}", "sell",
+                    from_amount, price=to_amount / from_amount, cost=to_amount,
+                ))
+            else:
+                rows.append(self.row(
+                    "convert", order["orderId"], order["createTime"], f"{to_asset}/{from_asset}", "buy",
+                    to_amount, price=from_amount / to_amount, cost=from_amount,
+                ))
+        return rows
+
+    def fetch_earn_rewards(self, start, end):
+        """Simple Earn flexible and locked rewards as zero-cost buys"""
+        rows = []
+        requests = [
+            (self.exchange.sapiGetSimpleEarnFlexibleHistoryRewardsRecord, {"type": "BONUS"}),
+            (self.exchange.sapiGetSimpleEarnFlexibleHistoryRewardsRecord, {"type": "REALTIME"}),
+            (self.exchange.sapiGetSimpleEarnFlexibleHistoryRewardsRecord, {"type": "REWARDS"}),
+            (self.exchange.sapiGetSimpleEarnLockedHistoryRewardsRecord, {}),
+        ]
+        for request, params in requests:
+            page = 1
+            while True:
+                response = request({**params, "startTime": start, "endTime": end, "current": page, "size": 100})
+                records = response.get("rows", [])
+                for record in records:
+                    asset = record["asset"]
+                    if asset in CASH_ASSETS:
+                        continue
+                    amount = record.get("rewards", record.get("amount"))
+                    # Reward records carry no id, asset, time and type identify them
+                    record_id = f"{asset}-{record['time']}-{record.get('type', 'LOCKED')}-{record.get('projectId', '')}"
+                    rows.append(self.row("earn", record_id, record["time"], f"{asset}/USDT", "buy",
+                                         amount, price=0.0, cost=0.0))
+                if page * 100 >= int(response.get("total", 0)) or not records:
+                    break
+                page += 1
+                time.sleep(0.3)
+        return rows
+
+    def fetch_airdrops(self, start, end):
+        """Airdrops and other asset distributions as zero-cost buys"""
+        records = self.walk_back(
+            lambda window_end: self.exchange.sapiGetAssetAssetDividend(
+                {"startTime": start, "endTime": window_end, "limit": 500}
+            ).get("rows", []),
+            end, 500, "divTime",
+        )
+        rows = []
+        for record in records:
+            asset = record["asset"]
+            if asset in CASH_ASSETS:
+                continue
+            rows.append(self.row("airdrop", record["id"], record["divTime"], f"{asset}/USDT", "buy",
+                                 record["amount"], price=0.0, cost=0.0))
+        return rows
@@ -1,12 +1,20 @@
 from binance_operations import BinanceOperations
 from external_services import ExternalServices
 from analysis import Analysis
+from multi_account import MultiAccountAnalysis, CONSOLIDATED_ACCOUNT
+from presentation import export_results
+from scenarios import DCAScenarios
+from portfolio_history import PortfolioHistory
+from upload_queue import UploadQueue
 import os
 from pathlib import Path
 import argparse
 import pandas as pd
 
-def main(skip_fetch=False, show_cache=False, analyze_only=False, search_token=None, ignore_pair=None):
+def main(skip_fetch=False, show_cache=False, analyze_only=False, search_token=None, ignore_pair=None,
+         accounts=None, history_symbol=None, history_runs=10, export_formats=None,
+         show_dca=False, cost_method="fifo", portfolio_history=False, migration_days=None,
+         drain_uploads=False):
     """
     Run the analysis with various options
     
@@ -14,13 +22,27 @@ def main(skip_fetch=False, show_cache=False, analyze_only=False, search_token=No
         skip_fetch (bool): If True, skips fetching new data and uses existing CSV files
         show_cache (bool): If True, shows contents of the CoinGecko cache
         analyze_only (bool): If True, runs analysis without uploading to Google Sheets
-        search_token (str): Token symbol to search for in cache
+        search_token (str): Symbol, id or name to search the coin list for
         ignore_pair (str): Trading pair to add to ignore list
+        accounts (str): Path to an accounts JSON config for multi-account mode
+        history_symbol (str): Pair to show from the snapshot history
+        history_runs (int): Number of recent runs to show for history_symbol
+        export_formats (list): Additional result formats to write (parquet, json, xlsx)
+        show_dca (bool): If True, prints averaging-down scenarios for held positions
+        cost_method (str): Lot matching for realized PnL: fifo, lifo or average
+        portfolio_history (bool): If True, rebuilds daily portfolio value and PnL
+        migration_days (int): Show cohort changes of mapped tokens over this many days
+        drain_uploads (bool): If True, uploads queued results and exits (run by the upload worker)
     """
     # Initialize components
     binance = BinanceOperations()
     external = ExternalServices()
-    analysis = Analysis(binance, external)
+    analysis = Analysis(binance, external, cost_method=cost_method)
+    uploads = UploadQueue()
+
+    if drain_uploads:
+        uploads.drain(lambda payload: external.upload_to_google_sheets(**payload))
+        return
     
     if ignore_pair:
         binance.add_to_ignore_list(ignore_pair)
@@ -36,25 +58,82 @@ def main(skip_fetch=False, show_cache=False, analyze_only=False, search_token=No
     if show_cache:
         external.inspect_cache(search_token)
         return
+
+    if history_symbol:
+        if accounts:
+            # The consolidated report keeps its own history
+            analysis = Analysis(BinanceOperations(account=CONSOLIDATED_ACCOUNT), external, cost_method=cost_method)
+        analysis.show_history(history_symbol, last_n=history_runs)
+        return
+
+    if migration_days:
+        migrations = external.archive.cohort_migrations(
+            analysis.cohorts, days=migration_days, coin_ids=external.coin_ids.values()
+        )
+        if migrations.empty:
+            print(f"\nNo mapped token changed cohort in the last {migration_days} days")
+        else:
+            print(f"\nCohort changes over the last {migration_days} days:")
+            print(migrations.to_string(index=False))
+        return
+
+    if portfolio_history:
+        history = PortfolioHistory(binance).build(binance.load_trades(), fetch=not skip_fetch)
+        output_filename = os.path.join("data", "portfolio_history.csv")
+        os.makedirs("data", exist_ok=True)
+        history.to_csv(output_filename)
+        print(f"\nDaily portfolio history saved to {output_filename}")
+        print(history.tail(30))
+        return
     
-    if not skip_fetch:
-        # Update external data
-        print("Fetching new data...")
-        external.update_coingecko_cache()
-        binance.fetch_all_trades()
+    if accounts:
+        # Per-account reports are saved by the workers, upload the consolidated one
+        runner = MultiAccountAnalysis(accounts, external, cost_method=cost_method)
+        results, _ = runner.run(skip_fetch=skip_fetch)
+        if results is None:
+            return
+        unchanged = runner.unchanged
+        report = runner.analysis
     else:
-        print("Using existing data files...")
-    
-    # Run analysis
-    results = analysis.analyze_trades()
+        if not skip_fetch:
+            # Update external data, market data only once it is stale so
+            # runs without new trades can reuse the previous results
+            print("Fetching new data...")
+            external.load_from_cache()
+            binance.fetch_all_trades()
+            binance.fetch_ledger()
+        else:
+            print("Using existing data files...")
+
+        # Run analysis
+        results = analysis.analyze_trades()
+        unchanged = analysis.unchanged
+        report = analysis
+
+    if export_formats:
+        export_results(results, os.path.join("data", "binance_api_analysis"), export_formats)
+
+    if show_dca:
+        grid = DCAScenarios(binance).grid(results)
+        print("\nAveraging scenarios (extra USD and resulting breakeven per price move):")
+        print(grid.summary().to_string(index=False))
+        for pair, reason in zip(grid.excluded["Pair"], grid.excluded["Reason"]):
+            print(f"Skipped {pair}: {reason}")
+
+    if unchanged:
+        print("Nothing changed since last run, upload skipped")
+        # An upload that ran out of retries is still waiting for a worker
+        if uploads.pending():
+            uploads.start_worker()
+        return
     
-    # Handle upload based on mode
+    # Handle upload based on mode, the background worker does the upload
     if analyze_only:
         upload = input("\nUpload to Google Sheets? (y/n): ").lower()
-        if upload == 'y':
-            external.upload_to_google_sheets(results)
-    else:
-        external.upload_to_google_sheets(results)
+        if upload != 'y':
+            return
+    uploads.enqueue(report.report_payload(results))
+    uploads.start_worker()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Binance Trade Analysis Tool')
@@ -65,13 +144,40 @@ if __name__ == "__main__":
     parser.add_argument('--analyze-only', action='store_true',
                        help='Run analysis only with optional upload prompt')
     parser.add_argument('search_token', nargs='?', default=None,
-                       help='Token symbol to search for in cache (e.g., BTC)')
+                       help='Symbol, id or name to search the coin list for (e.g., BTC)')
     parser.add_argument('--ignore-pair', type=str,
                        help='Add trading pair to ignore list (e.g., WMT/USDT)')
+    parser.add_argument('--accounts', type=str,
+                       help='Analyze all accounts from a JSON config (e.g., accounts.json)')
+    parser.add_argument('--history', type=str, metavar='SYMBOL',
+                       help='Show stored results of a pair over recent runs (e.g., BTC or TOTAL)')
+    parser.add_argument('--runs', type=int, default=10,
+                       help='Number of recent runs shown by --history')
+    parser.add_argument('--export', type=str, metavar='FORMATS',
+                       help='Also write results as parquet, json and/or xlsx (e.g., parquet,xlsx)')
+    parser.add_argument('--dca', action='store_true',
+                       help='Show averaging-down scenarios for held positions')
+    parser.add_argument('--cost-method', choices=['fifo', 'lifo', 'average'], default='fifo',
+                       help='Lot matching used for realized/unrealized PnL (default: fifo)')
+    parser.add_argument('--cohort-migrations', type=int, nargs='?', const=30, metavar='DAYS',
+                       help='Show mapped tokens that changed market cap cohort (default: 30 days)')
+    parser.add_argument('--portfolio-history', action='store_true',
+                       help='Rebuild daily portfolio value and PnL from trades and cached daily closes')
+    parser.add_argument('--drain-uploads', action='store_true',
+                       help='Upload queued results to Google Sheets and exit')
     args = parser.parse_args()
     
     main(skip_fetch=args.skip_fetch, 
          show_cache=args.show_cache,
          analyze_only=args.analyze_only,
          search_token=args.search_token,
-         ignore_pair=args.ignore_pair) 
\ No newline at end of file
+         ignore_pair=args.ignore_pair,
+         accounts=args.accounts,
+         history_symbol=args.history,
+         history_runs=args.runs,
+         export_formats=args.export.split(',') if args.export else None,
+         show_dca=args.dca,
+         cost_method=args.cost_method,
+         portfolio_history=args.portfolio_history,
+         migration_days=args.cohort_migrations,
+         drain_uploads=args.drain_uploads) 
\ No newline at end of file
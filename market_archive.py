@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import json
+import time
+
+RECORD_DTYPE = np.dtype([
+    ("coin", "<i4"),
+    ("price", "<f8"),
+    ("market_cap", "<f8"),
+    ("fdv", "<f8"),
+])
+SNAPSHOT_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("start", "<i8"),
+    ("count", "<i8"),
+])
+
+
+class MarketArchive:
+    """
+    Append-only archive of CoinGecko market snapshots
+
+    Every refresh appends fixed-width (coin, price, market cap, FDV) records
+    to records.bin plus one (timestamp, start, count) row to snapshots.bin.
+    Coin ids map to indices through ids.json. Both binary files are opened
+    as read-only memory maps, so reading one snapshot only touches its pages.
+    """
+
+    def __init__(self, archive_dir=Path("Cache") / "market_archive"):
+        """
+        Args:
+            archive_dir (Path): Folder holding ids.json, records.bin and snapshots.bin
+        """
+        self.archive_dir = Path(archive_dir)
+        self.ids_file = self.archive_dir / "ids.json"
+        self.records_file = self.archive_dir / "records.bin"
+        self.snapshots_file = self.archive_dir / "snapshots.bin"
+        self.ids = self.load_ids()
+        self.id_index = {coin_id: index for index, coin_id in enumerate(self.ids)}
+
+    def load_ids(self):
+        """Load the coin id list, position in the list is the coin index"""
+        try:
+            if self.ids_file.exists():
+                with open(self.ids_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading market archive ids: {e}")
+        return []
+
+    @staticmethod
+    def open_array(path, dtype):
+        """Read-only memory map of a record file, empty if missing"""
+        if not path.exists() or path.stat().st_size < dtype.itemsize:
+            return np.empty(0, dtype=dtype)
+        count = path.stat().st_size // dtype.itemsize
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def snapshots(self):
+        return self.open_array(self.snapshots_file, SNAPSHOT_DTYPE)
+
+    def records(self):
+        return self.open_array(self.records_file, RECORD_DTYPE)
+
+    def is_empty(self):
+        return len(self.snapshots()) == 0
+
+    def append(self, market_data, timestamp=None):
+        """
+        Archive one CoinGecko markets snapshot
+
+        Args:
+            market_data (list): Coin dicts as returned by get_coins_markets
+            timestamp (float): Snapshot time, defaults to the data's _timestamp
+        Returns:
+            bool: False if a snapshot with this timestamp is already archived
+        """
+        if not market_data:
+            return False
+        timestamp = timestamp or market_data[0].get('_timestamp') or time.time()
+        snapshots = self.snapshots()
+        if len(snapshots) and snapshots["timestamp"][-1] >= timestamp:
+            return False
+
+        new_ids = False
+        for coin in market_data:
+            if coin["id"] not in self.id_index:
+                self.id_index[coin["id"]] = len(self.ids)
+                self.ids.append(coin["id"])
+                new_ids = True
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        if new_ids:
+            with open(self.ids_file, 'w') as f:
+                json.dump(self.ids, f)
+
+        def number(value):
+            return np.nan if value is None else value
+
+        records = np.array([
+            (
+                self.id_index[coin["id"]],
+                number(coin.get("current_price")),
+                number(coin.get("market_cap")),
+                number(coin.get("fully_diluted_valuation")),
+            )
+            for coin in market_data
+        ], dtype=RECORD_DTYPE)
+        start = len(self.records())
+        with open(self.records_file, 'ab') as f:
+            f.write(records.tobytes())
+        with open(self.snapshots_file, 'ab') as f:
+            f.write(np.array([(timestamp, start, len(records))], dtype=SNAPSHOT_DTYPE).tobytes())
+        return True
+
+    def values_at(self, timestamp, field="market_cap"):
+        """
+        Field value of every archived coin in the last snapshot at or before timestamp
+
+        Returns:
+            ndarray: Value per coin index, all NaN if no snapshot is old enough
+        """
+        values = np.full(len(self.ids), np.nan)
+        snapshots = self.snapshots()
+        position = np.searchsorted(snapshots["timestamp"], timestamp, side="right") - 1
+        if position < 0:
+            return values
+        start, count = int(snapshots["start"][position]), int(snapshots["count"][position])
+        records = self.records()[start:start + count]
+        values[records["coin"]] = records[field]
+        return values
+
+    def series(self, coin_id, field="market_cap"):
+        """Field value of one coin across all snapshots"""
+        if coin_id not in self.id_index:
+            return pd.Series(dtype=float)
+        records = self.records()
+        rows = np.flatnonzero(records["coin"] == self.id_index[coin_id])
+        snapshots = self.snapshots()
+        # Map each record back to its snapshot through the start offsets
+        owners = np.searchsorted(snapshots["start"], rows, side="right") - 1
+        times = pd.to_datetime(snapshots["timestamp"][owners], unit="s")
+        return pd.Series(np.asarray(records[field][rows]), index=times, name=coin_id)
+
+    def trend(self, days=30, field="market_cap"):
+        """
+        Percentage change of a field between the latest snapshot and days ago
+
+        Returns:
+            dict: coin id -> change in percent, coins without both values are left out
+        """
+        snapshots = self.snapshots()
+        if not len(snapshots):
+            return {}
+        latest_time = snapshots["timestamp"][-1]
+        latest = self.values_at(latest_time, field)
+        previous = self.values_at(latest_time - days * 86400, field)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = (latest / previous - 1) * 100
+        valid = np.flatnonzero(np.isfinite(change))
+        return {self.ids[index]: round(float(change[index]), 1) for index in valid}
+
+    def cohort_migrations(self, cohort_engine, days=30, coin_ids=None):
+        """
+        Coins whose market cap cohort changed over the last days
+
+        Args:
+            cohort_engine (CohortEngine): Cohort definitions to classify with
+            days (int): Look-back window
+            coin_ids (iterable): Optional coins to restrict the result to
+        Returns:
+            DataFrame: Coin, cohorts then and now, and the market cap change
+        """
+        columns = ["Coin", "From", "To", "MC then", "MC now"]
+        snapshots = self.snapshots()
+        if not len(snapshots):
+            return pd.DataFrame(columns=columns)
+        latest_time = snapshots["timestamp"][-1]
+        latest = self.values_at(latest_time)
+        previous = self.values_at(latest_time - days * 86400)
+
+        before = cohort_engine.classify(previous)
+        after = cohort_engine.classify(latest)
+        moved = (before != after) & ~np.isnan(previous) & ~np.isnan(latest)
+        if coin_ids is not None:
+            wanted = np.zeros(len(self.ids), dtype=bool)
+            wanted[[self.id_index[c] for c in coin_ids if c in self.id_index]] = True
+            moved &= wanted
+
+        rows = np.flatnonzero(moved)
+        return pd.DataFrame({
+            "Coin": [self.ids[index] for index in rows],
+            "From": before[rows],
+            "To": after[rows],
+            "MC then": previous[rows],
+            "MC now": latest[rows],
+        }, columns=columns)
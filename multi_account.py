@@ -0,0 +1,149 @@
+from binance_operations import BinanceOperations
+from external_services import ExternalServices
+from analysis import Analysis
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from dotenv import load_dotenv
+import pandas as pd
+import json
+import os
+
+# Account name of the consolidated report, keeps its history and run cache apart
+CONSOLIDATED_ACCOUNT = "_consolidated"
+
+
+def load_accounts(config_path):
+    """
+    Load account credential sets from a JSON config
+
+    Each entry needs a "name" plus either literal "api_key"/"secret" values or
+    "api_key_env"/"secret_env" naming variables defined in .env, e.g.
+        [{"name": "main", "api_key_env": "MAIN_KEY", "secret_env": "MAIN_SECRET"}]
+
+    Args:
+        config_path (str): Path to the accounts JSON file
+    Returns:
+        list: Dicts with name, api_key and secret
+    """
+    load_dotenv(dotenv_path=Path(".") / ".env")
+    with open(config_path, 'r') as f:
+        entries = json.load(f)
+
+    accounts = []
+    for entry in entries:
+        name = entry.get("name")
+        if not name:
+            raise ValueError(f"Account entry without a name in {config_path}")
+        if name == CONSOLIDATED_ACCOUNT:
+            raise ValueError(f"Account name '{name}' is reserved for the consolidated report")
+        if name in [account["name"] for account in accounts]:
+            raise ValueError(f"Duplicate account name '{name}' in {config_path}")
+        api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", ""))
+        secret = entry.get("secret") or os.getenv(entry.get("secret_env", ""))
+        if not api_key or not secret:
+            raise ValueError(f"Missing credentials for account '{name}'")
+        accounts.append({"name": name, "api_key": api_key, "secret": secret})
+    return accounts
+
+
+def analyze_account(account, skip_fetch=False, cost_method="fifo"):
+    """
+    Fetch and analyze a single account; runs inside a worker process
+
+    The worker only reads the shared market cache and token mappings, so
+    unknown tokens are reported back instead of prompting for a mapping.
+    """
+    binance = BinanceOperations(
+        api_key=account["api_key"],
+        api_secret=account["secret"],
+        account=account["name"]
+    )
+    external = ExternalServices(connect_google=False)
+    analysis = Analysis(binance, external, interactive=False, cost_method=cost_method)
+
+    if not skip_fetch:
+        binance.fetch_all_trades()
+        binance.fetch_ledger()
+    trades_df, total_balance = binance.get_trades_analysis_data()
+    results = analysis.analyze_trades(trades_df, total_balance)
+
+    return {
+        "name": account["name"],
+        "results": results,
+        "trades": trades_df,
+        "balance": total_balance,
+        "unmapped": analysis.unmapped_tokens,
+    }
+
+
+class MultiAccountAnalysis:
+    def __init__(self, config_path, external_services, max_workers=None, cost_method="fifo"):
+        """
+        Args:
+            config_path (str): Path to the accounts JSON file
+            external_services: ExternalServices instance of the parent process
+            max_workers (int): Worker process limit, defaults to one per account
+            cost_method (str): Lot matching method passed to every Analysis
+        """
+        self.accounts = load_accounts(config_path)
+        self.external = external_services
+        self.max_workers = max_workers or len(self.accounts)
+        self.cost_method = cost_method
+        self.unchanged = False
+        self.analysis = None
+
+    def run(self, skip_fetch=False):
+        """
+        Analyze every account in parallel and build a consolidated report
+
+        Returns:
+            tuple: (consolidated results DataFrame, dict of per-account reports)
+        """
+        if not self.accounts:
+            print("No accounts configured")
+            return None, {}
+
+        # Refresh the shared market snapshot once if it is stale, workers only read it
+        self.external.load_from_cache()
+
+        reports = {}
+        print(f"\nAnalyzing {len(self.accounts)} accounts...")
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(analyze_account, account, skip_fetch, self.cost_method): account["name"]
+                for account in self.accounts
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    reports[name] = future.result()
+                    print(f"Account {name} done")
+                except Exception as e:
+                    print(f"Error analyzing account {name}: {e}")
+
+        if not reports:
+            return None, reports
+
+        return self.consolidate(reports), reports
+
+    def consolidate(self, reports):
+        """Analyze the merged trades and summed balances of all accounts"""
+        trades_df = pd.concat(
+            [report["trades"] for report in reports.values()], ignore_index=True
+        )
+        total_balance = {}
+        for report in reports.values():
+            for currency, amount in report["balance"].items():
+                total_balance[currency] = total_balance.get(currency, 0) + (amount or 0)
+
+        # Tokens the workers could not map get resolved interactively here
+        unmapped = set().union(*(report["unmapped"] for report in reports.values()))
+        if unmapped:
+            print(f"\nTokens unmapped in account reports: {', '.join(sorted(unmapped))}")
+
+        print(f"\nConsolidated report across {len(reports)} accounts:")
+        analysis = Analysis(BinanceOperations(account=CONSOLIDATED_ACCOUNT), self.external, cost_method=self.cost_method)
+        results = analysis.analyze_trades(trades_df, total_balance)
+        self.unchanged = analysis.unchanged
+        self.analysis = analysis
+        return results
@@ -0,0 +1,166 @@
+import numpy as np
+from pathlib import Path
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows, appends are not locked
+    fcntl = None
+
+CANDLE_DTYPE = np.dtype([
+    ("timestamp", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+TIMEFRAME_MS = {"1h": 3600 * 1000, "4h": 4 * 3600 * 1000, "1d": 86400 * 1000}
+
+
+class OHLCVStore:
+    """
+    Local candle cache of fixed-width records, one file per symbol and timeframe
+
+    Files grow by appending closed candles (or, rarely, by a backfill that
+    rewrites them with older candles in front) and are read back as
+    read-only memory maps, so nothing already cached is downloaded or parsed again.
+    """
+
+    def __init__(self, exchange, store_dir=Path("Cache") / "ohlcv"):
+        """
+        Args:
+            exchange: ccxt exchange used for klines
+            store_dir (Path): Folder holding the candle files
+        """
+        self.exchange = exchange
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, symbol, timeframe):
+        """Candle file of a symbol, e.g. Cache/ohlcv/BTC_USDT_1d.bin"""
+        return self.store_dir / f"{symbol.replace('/', '_')}_{timeframe}.bin"
+
+    def load(self, symbol, timeframe="1d"):
+        """Memory-mapped candles of a symbol, empty if nothing is cached"""
+        return self.load_path(self.path(symbol, timeframe))
+
+    @staticmethod
+    def load_path(path):
+        if not path.exists() or path.stat().st_size < CANDLE_DTYPE.itemsize:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        count = path.stat().st_size // CANDLE_DTYPE.itemsize
+        return np.memmap(path, dtype=CANDLE_DTYPE, mode="r", shape=(count,))
+
+    def update(self, symbol, since, timeframe="1d"):
+        """
+        Download closed candles missing between since and now and store them
+
+        Candles after the last cached one are appended; candles older than
+        the first cached one are backfilled by rewriting the file with them
+        in front.
+
+        Args:
+            symbol (str): Market symbol, e.g. 'BTC/USDT'
+            since (int): Earliest candle wanted, in ms
+            timeframe (str): ccxt timeframe
+        Returns:
+            int: Number of candles added
+        """
+        step = TIMEFRAME_MS[timeframe]
+        path = self.path(symbol, timeframe)
+        # Klines start at or after since, so align it to the candle holding it
+        since = int(since) // step * step
+        # Account workers may top up the same file concurrently; the lock
+        # lives in its own file because a backfill replaces the candle file
+        with open(path.with_suffix(".lock"), 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            added = 0
+            complete = True
+            stored = self.load(symbol, timeframe)
+            if len(stored) and since < self.covered_since(path):
+                older, complete = self.fetch_range(symbol, since, int(stored["timestamp"][0]), timeframe)
+                if len(older):
+                    tmp_file = path.with_suffix(".tmp")
+                    with open(tmp_file, 'wb') as f:
+                        f.write(older.tobytes())
+                        f.write(np.asarray(stored).tobytes())
+                    del stored
+                    tmp_file.replace(path)
+                    added += len(older)
+                stored = self.load(symbol, timeframe)
+
+            start = since
+            if len(stored):
+                start = max(start, int(stored["timestamp"][-1]) + step)
+            newer, forward_complete = self.fetch_range(symbol, start, None, timeframe)
+            if len(newer):
+                with open(path, 'ab') as f:
+                    f.write(newer.tobytes())
+                added += len(newer)
+
+            # Remember how far back was asked for, candles before a listing don't exist
+            if complete and forward_complete and since < self.covered_since(path):
+                path.with_suffix(".since").write_text(str(since))
+        return added
+
+    def covered_since(self, path):
+        """Earliest time already downloaded for a candle file, in ms"""
+        stored = self.load_path(path)
+        covered = int(stored["timestamp"][0]) if len(stored) else np.iinfo(np.int64).max
+        try:
+            covered = min(covered, int(path.with_suffix(".since").read_text()))
+        except (FileNotFoundError, ValueError):
+            pass
+        return covered
+
+    def fetch_range(self, symbol, start, end, timeframe):
+        """
+        Closed candles opened from start up to end (exclusive, None for now)
+
+        Returns:
+            tuple: (candle records, False if a request failed part way)
+        """
+        step = TIMEFRAME_MS[timeframe]
+        now_ms = int(time.time() * 1000)
+        end = now_ms if end is None else end
+        pages = []
+        while start < end and start + step <= now_ms:
+            try:
+                candles = self.exchange.fetch_ohlcv(symbol, timeframe, since=start, limit=1000)
+            except Exception as e:
+                print(f"Cannot fetch candles for {symbol}: {e}")
+                return self.concat(pages), False
+
+            # Only closed candles are cached, the running one would change
+            closed = [c for c in candles if start <= c[0] < end and c[0] + step <= now_ms]
+            if not closed:
+                break
+            pages.append(np.array([tuple(c[:6]) for c in closed], dtype=CANDLE_DTYPE))
+            start = int(pages[-1]["timestamp"][-1]) + step
+            time.sleep(0.3)  # Rate limiting
+        return self.concat(pages), True
+
+    @staticmethod
+    def concat(pages):
+        return np.concatenate(pages) if pages else np.empty(0, dtype=CANDLE_DTYPE)
+
+    def closes_asof(self, symbol, timestamps, timeframe="1d"):
+        """
+        Close of the last candle opened at or before each timestamp
+
+        Args:
+            symbol (str): Market symbol
+            timestamps (ndarray): Times in ms
+        Returns:
+            ndarray: Close per timestamp, NaN before the first cached candle
+        """
+        candles = self.load(symbol, timeframe)
+        result = np.full(len(timestamps), np.nan)
+        if not len(candles):
+            return result
+        index = np.searchsorted(candles["timestamp"], timestamps, side="right") - 1
+        valid = index >= 0
+        result[valid] = candles["close"][index[valid]]
+        return result
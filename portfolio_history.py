@@ -0,0 +1,76 @@
+from ohlcv_store import OHLCVStore, TIMEFRAME_MS
+import numpy as np
+import pandas as pd
+import time
+
+DAY_MS = TIMEFRAME_MS["1d"]
+
+
+class PortfolioHistory:
+    def __init__(self, binance_ops, store=None):
+        """
+        Args:
+            binance_ops: BinanceOperations instance
+            store (OHLCVStore): Candle cache, defaults to Cache/ohlcv
+        """
+        self.binance = binance_ops
+        self.store = store or OHLCVStore(binance_ops.exchange)
+
+    def daily_positions(self, trades_df):
+        """
+        Cumulative token amount per symbol and net invested USD per day
+
+        Returns:
+            tuple: (day timestamps in ms, symbols, positions array (days x symbols),
+                    invested array (days,))
+        """
+        trades = trades_df[~trades_df["symbol"].isin(self.binance.pairs_to_skip)]
+        sign = np.where(trades["side"].to_numpy() == "buy", 1.0, -1.0)
+        days = trades["timestamp"].to_numpy(dtype=np.int64) // DAY_MS * DAY_MS
+
+        first_day = int(days.min())
+        last_day = int(time.time() * 1000) // DAY_MS * DAY_MS
+        day_index = np.arange(first_day, last_day + DAY_MS, DAY_MS, dtype=np.int64)
+        rows = (days - first_day) // DAY_MS
+
+        symbols, columns = np.unique(trades["symbol"].to_numpy(dtype=str), return_inverse=True)
+        flows = np.zeros((len(day_index), len(symbols)))
+        np.add.at(flows, (rows, columns), sign * trades["amount"].to_numpy(dtype=float))
+        invested = np.zeros(len(day_index))
+        np.add.at(invested, rows, sign * trades["cost"].to_numpy(dtype=float))
+
+        return day_index, symbols, flows.cumsum(axis=0), invested.cumsum()
+
+    def build(self, trades_df, fetch=True):
+        """
+        Daily portfolio value and PnL rebuilt from the trade history
+
+        Positions are joined as-of against cached daily closes; with fetch
+        set only candles missing from the cache are downloaded.
+
+        Args:
+            trades_df (DataFrame): Fills with symbol, side, amount, cost, timestamp
+            fetch (bool): If True, tops up the candle cache first
+        Returns:
+            DataFrame: Value, Invested and PnL per day
+        """
+        if trades_df.empty:
+            return pd.DataFrame(columns=["Value", "Invested", "PnL"])
+
+        day_index, symbols, positions, invested = self.daily_positions(trades_df)
+        closes = np.zeros_like(positions)
+        for column, symbol in enumerate(symbols):
+            held = np.flatnonzero(positions[:, column] > 0)
+            if not len(held):
+                continue
+            if fetch:
+                self.store.update(symbol, since=int(day_index[held[0]]))
+            closes[:, column] = np.nan_to_num(self.store.closes_asof(symbol, day_index))
+
+        value = (np.clip(positions, 0, None) * closes).sum(axis=1)
+        history = pd.DataFrame({
+            "Value": value.round(2),
+            "Invested": invested.round(2),
+            "PnL": (value - invested).round(2),
+        }, index=pd.to_datetime(day_index, unit="ms").rename("Date"))
+        return history
@@ -0,0 +1,122 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+
+def format_market_cap(cap):
+    """Format market cap into human readable string"""
+    try:
+        cap = float(cap)
+    except (ValueError, TypeError):
+        return "0"
+    if np.isnan(cap):
+        return "0"
+
+    if cap >= 1e9:
+        return f"{cap/1e9:.1f}B"
+    elif cap >= 1e6:
+        return f"{cap/1e6:.1f}M"
+    else:
+        return f"{cap:.1f}"
+
+
+# Decimals shown per column, prices use significant digits instead
+DISPLAY_DECIMALS = {
+    "USD_spent": 1, "USD_value": 1, "USD_spent%": 1, "USD_value%": 1, "PnL": 0,
+    "pnl%": 0, "Pr_diff%": 0, "BuyExtr$": 0, "Avlbl T": 2, "USD_sell": 0,
+    "Realized": 1, "Unrealized": 1, "Hold d": 1,
+}
+
+
+def format_price(price):
+    """Three decimals for prices from 1 up, four significant digits below so sub-cent prices stay visible"""
+    if pd.isna(price):
+        return price
+    if abs(price) >= 1 or price == 0:
+        return f"{price:.3f}"
+    decimals = 3 - int(np.floor(np.log10(abs(price))))
+    return f"{price:.{decimals}f}"
+
+
+def format_report(df):
+    """
+    Build the human readable view of numeric analysis results
+
+    Values are rounded for display (results are stored at full precision),
+    spent and value get their portfolio share appended, percentage columns
+    get a '%' suffix, market caps are abbreviated and empty TOTAL cells show
+    '---'. Only console output uses this view.
+
+    Args:
+        df (DataFrame): Numeric results from Analysis.analyze_trades
+    Returns:
+        DataFrame: String formatted copy
+    """
+    view = df.copy()
+    is_total = view["Pair"] == "TOTAL"
+
+    for column, decimals in DISPLAY_DECIMALS.items():
+        rounded = view[column].round(decimals)
+        if column == "pnl%":
+            # The total keeps one decimal
+            rounded = rounded.where(~is_total, view[column].round(1))
+        elif decimals == 0:
+            rounded = rounded.astype("Int64")
+        view[column] = rounded
+    for column in ("AvPr", "CrPr"):
+        view[column] = view[column].map(format_price)
+
+    for column in ("USD_spent", "USD_value"):
+        values = view[column].astype(str)
+        shares = view[f"{column}%"].astype(str)
+        view[column] = values.where(is_total, values + " (" + shares + "%)")
+    view = view.drop(columns=["USD_spent%", "USD_value%"])
+
+    for column in ("pnl%", "Pr_diff%"):
+        view[column] = view[column].map(
+            lambda value: "---" if pd.isna(value) else f"{value:g}%"
+        )
+
+    mc_header = "MC"
+    updated = df.attrs.get("market_cache_updated")
+    if updated:
+        mc_header = f"MC{updated}"
+    view["MC"] = view["MC"].map(format_market_cap).where(~is_total, "---")
+    view = view.rename(columns={"MC": mc_header})
+
+    return view.astype(object).where(view.notna(), "---")
+
+
+def export_results(df, output_base, formats):
+    """
+    Export numeric results to additional formats
+
+    Args:
+        df (DataFrame): Numeric results from Analysis.analyze_trades
+        output_base (str): Output path without extension
+        formats (list): Any of 'parquet', 'json', 'xlsx'
+    Returns:
+        list: Paths written
+    """
+    writers = {
+        "parquet": lambda path: df.to_parquet(path, index=False),
+        "json": lambda path: df.to_json(path, orient="records", indent=1),
+        "xlsx": lambda path: df.to_excel(path, index=False, sheet_name="Analysis"),
+    }
+    written = []
+    Path(output_base).parent.mkdir(parents=True, exist_ok=True)
+    for fmt in formats:
+        fmt = fmt.strip().lower()
+        if fmt not in writers:
+            print(f"Unknown export format '{fmt}', expected one of {', '.join(writers)}")
+            continue
+        path = f"{output_base}.{fmt}"
+        try:
+            writers[fmt](path)
+            written.append(path)
+            print(f"Exported {path}")
+        except ImportError as e:
+            print(f"Cannot export {fmt}, missing dependency: {e}")
+        except Exception as e:
+            print(f"Error exporting {fmt}: {e}")
+    return written
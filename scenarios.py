@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from presentation import format_price
+
+# Relative price moves and target average prices (as a fraction of AvPr)
+DEFAULT_PRICE_MOVES = np.round(np.linspace(-0.9, 0.0, 91), 2)
+DEFAULT_TARGETS = np.round(np.linspace(0.5, 0.99, 50), 2)
+
+
+class ScenarioGrid:
+    """
+    Result of DCAScenarios.grid
+
+    Attributes:
+        symbols (ndarray): Pair of every position, shape (n,)
+        price_moves (ndarray): Relative price changes, shape (m,)
+        targets (ndarray): Target average prices as a fraction of AvPr, shape (k,)
+        prices (ndarray): Hypothetical prices, shape (n, m)
+        extra_usd (ndarray): USD to buy under the BuyExtr$ rule, shape (n, m)
+        breakeven (ndarray): Average price after that purchase, shape (n, m)
+        target_usd (ndarray): USD to buy to reach each target, shape (n, m, k)
+        excluded (DataFrame): Pair and reason of positions left out of the grid
+    NaN marks combinations where averaging down does not apply.
+    """
+
+    def __init__(self, symbols, price_moves, targets, prices, extra_usd, breakeven, target_usd, excluded):
+        self.symbols = symbols
+        self.price_moves = price_moves
+        self.targets = targets
+        self.prices = prices
+        self.extra_usd = extra_usd
+        self.breakeven = breakeven
+        self.target_usd = target_usd
+        self.excluded = excluded
+
+    def symbol_frame(self, symbol):
+        """USD needed per hypothetical price (rows) and target average (columns)"""
+        index = int(np.flatnonzero(self.symbols == symbol)[0])
+        return pd.DataFrame(
+            self.target_usd[index],
+            index=pd.Index(self.prices[index], name="Price"),
+            columns=pd.Index(self.targets, name="Target/AvPr"),
+        )
+
+    def summary(self, moves=(-0.1, -0.2, -0.3, -0.5)):
+        """Extra USD and resulting breakeven per position at selected price moves"""
+        columns = {"Pair": self.symbols}
+        for move in moves:
+            step = int(np.abs(self.price_moves - move).argmin())
+            label = f"{self.price_moves[step]:+.0%}"
+            columns[f"Buy$ {label}"] = self.extra_usd[:, step].round(0)
+            # Significant digits, so sub-cent breakevens stay visible
+            columns[f"BE {label}"] = [format_price(price) for price in self.breakeven[:, step]]
+        return pd.DataFrame(columns)
+
+
+class DCAScenarios:
+    def __init__(self, binance_ops):
+        self.binance = binance_ops
+
+    def positions(self, results):
+        """
+        Split held positions into usable ones and ones the grid can't use
+
+        Returns:
+            tuple: (DataFrame of positions with a usable amount, average and
+                   current price, DataFrame with Pair and Reason of the rest)
+        """
+        rows = results[results["Pair"] != "TOTAL"]
+        reasons = pd.Series(None, index=rows.index, dtype=object)
+        # First failing check wins
+        reasons = reasons.mask(~(rows["Expct T"] > 0) & reasons.isna(), "nothing held")
+        reasons = reasons.mask(~(rows["AvPr"] > 0) & reasons.isna(), "no average price")
+        reasons = reasons.mask(~(rows["CrPr"] > 0) & reasons.isna(), "no current price")
+        excluded = pd.DataFrame({"Pair": rows["Pair"], "Reason": reasons})[reasons.notna()]
+        return rows[reasons.isna()].reset_index(drop=True), excluded.reset_index(drop=True)
+
+    def grid(self, results, price_moves=DEFAULT_PRICE_MOVES, targets=DEFAULT_TARGETS):
+        """
+        Evaluate averaging purchases over a grid of prices and targets
+
+        The BuyExtr$ rule from BinanceOperations.additional_purchase is
+        broadcast over every position and price at once; the target grid
+        solves Q * (A - T) / (T - P) extra tokens to move the average A of Q
+        tokens down to T when buying at P.
+
+        Args:
+            results (DataFrame): Numeric results from Analysis.analyze_trades
+            price_moves (array): Relative price changes from the current price
+            targets (array): Target average prices as a fraction of AvPr
+        Returns:
+            ScenarioGrid
+        """
+        positions, excluded = self.positions(results)
+        price_moves = np.asarray(price_moves, dtype=float)
+        targets = np.asarray(targets, dtype=float)
+
+        amount = positions["Expct T"].to_numpy(dtype=float)[:, None]
+        average = positions["AvPr"].to_numpy(dtype=float)[:, None]
+        current = positions["CrPr"].to_numpy(dtype=float)[:, None]
+        prices = current * (1 + price_moves[None, :])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # BuyExtr$ rule, applies only below the average price
+            tokens = -self.binance.additional_purchase(amount, average, prices)
+            tokens = np.where((prices < average) & (prices > 0), tokens, np.nan)
+            extra_usd = tokens * prices
+            breakeven = (amount * average + tokens * prices) / (amount + tokens)
+
+            # Explicit targets, reachable only for prices below the target
+            target_prices = average[:, :, None] * targets[None, None, :]
+            buy_prices = prices[:, :, None]
+            target_tokens = amount[:, :, None] * (average[:, :, None] - target_prices) / (target_prices - buy_prices)
+            target_usd = np.where(
+                (buy_prices < target_prices) & (buy_prices > 0), target_tokens * buy_prices, np.nan
+            ).astype(np.float32)
+
+        return ScenarioGrid(
+            positions["Pair"].to_numpy(dtype=str), price_moves, targets,
+            prices, extra_usd, breakeven, target_usd, excluded
+        )
@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import json
+import time
+
+
+class SnapshotHistory:
+    """
+    Compressed columnar history of analysis results
+
+    Every stored run is a compressed .npz file holding one array per column,
+    so queries only decompress the columns they need. Once enough loose run
+    files pile up they are packed into a single segment file, and runs
+    beyond the retention limits are dropped.
+    """
+
+    def __init__(self, history_dir="History", keep_runs=1000, max_age_days=None, compact_after=50):
+        """
+        Args:
+            history_dir (str): Folder holding the manifest, snapshots and segments
+            keep_runs (int): Number of most recent runs to retain
+            max_age_days (int): Optional age limit for retained runs
+            compact_after (int): Pack loose snapshots once this many exist
+        """
+        self.history_dir = Path(history_dir)
+        self.manifest_file = self.history_dir / "manifest.json"
+        self.keep_runs = keep_runs
+        self.max_age_days = max_age_days
+        self.compact_after = compact_after
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        """Load the run manifest, starting an empty one if missing"""
+        try:
+            if self.manifest_file.exists():
+                with open(self.manifest_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading history manifest: {e}")
+        return {"runs": []}
+
+    def save_manifest(self):
+        """Save the run manifest"""
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        tmp_file.replace(self.manifest_file)
+
+    @staticmethod
+    def to_array(series):
+        """Convert a result column to a numeric or fixed-width string array"""
+        if pd.api.types.is_numeric_dtype(series):
+            return series.to_numpy(dtype=float)
+        numeric = pd.to_numeric(series, errors="coerce")
+        # Placeholders such as '---' in the TOTAL row don't make a column textual
+        placeholders = series[numeric.isna()].astype(str).isin(["---", "", "nan", "None"])
+        if placeholders.all():
+            return numeric.to_numpy(dtype=float)
+        return series.fillna("").astype(str).to_numpy(dtype=str)
+
+    @staticmethod
+    def digest(arrays):
+        """Content hash of a snapshot, used to skip identical runs"""
+        sha = hashlib.sha256()
+        for name, values in arrays.items():
+            sha.update(name.encode())
+            sha.update(str(values.dtype).encode())
+            sha.update(np.ascontiguousarray(values).tobytes())
+        return sha.hexdigest()
+
+    def write_arrays(self, filename, arrays):
+        """Write named column arrays to a compressed .npz file"""
+        path = self.history_dir / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        names = list(arrays.keys())
+        columns = {f"c{i}": arrays[name] for i, name in enumerate(names)}
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, __columns__=np.array(names, dtype=str), **columns)
+
+    def read_arrays(self, filename, columns=None):
+        """Read selected column arrays from a snapshot or segment file"""
+        with np.load(self.history_dir / filename, allow_pickle=False) as npz:
+            names = list(npz["__columns__"])
+            wanted = names if columns is None else [c for c in columns if c in names]
+            return {name: npz[f"c{names.index(name)}"] for name in wanted}
+
+    def record(self, df, timestamp=None):
+        """
+        Store analysis results as a new run
+
+        Args:
+            df (DataFrame): Analysis results
+            timestamp (float): Run time, defaults to now
+        Returns:
+            str: Run ID, or None if the results match the previous run
+        """
+        timestamp = timestamp or time.time()
+        arrays = {name: self.to_array(df[name]) for name in df.columns}
+        digest = self.digest(arrays)
+
+        runs = self.manifest["runs"]
+        if runs and runs[-1]["digest"] == digest:
+            print("Results unchanged since last stored run, snapshot skipped")
+            return None
+
+        run_id = datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
+        existing_ids = {run["run_id"] for run in runs}
+        suffix = 1
+        while run_id in existing_ids:
+            run_id = f"{run_id.split('-')[0]}-{suffix}"
+            suffix += 1
+
+        filename = f"snapshots/{run_id}.npz"
+        self.write_arrays(filename, arrays)
+        runs.append({
+            "run_id": run_id,
+            "timestamp": timestamp,
+            "digest": digest,
+            "file": filename,
+            "offset": 0,
+            "rows": len(df),
+        })
+
+        self.apply_retention()
+        loose = [run for run in runs if run["file"].startswith("snapshots/")]
+        if len(loose) >= self.compact_after:
+            self.compact()
+        self.save_manifest()
+        print(f"Snapshot stored: {run_id}")
+        return run_id
+
+    def apply_retention(self):
+        """Drop runs beyond the retention limits and delete unreferenced files"""
+        runs = self.manifest["runs"]
+        keep = runs[-self.keep_runs:] if self.keep_runs else list(runs)
+        if self.max_age_days:
+            cutoff = time.time() - self.max_age_days * 86400
+            keep = [run for run in keep if run["timestamp"] >= cutoff]
+        if len(keep) == len(runs):
+            return
+
+        self.manifest["runs"] = keep
+        self.remove_unreferenced({run["file"] for run in runs})
+
+    def remove_unreferenced(self, candidates):
+        """Delete files from candidates no longer referenced by any run"""
+        referenced = {run["file"] for run in self.manifest["runs"]}
+        for filename in candidates - referenced:
+            try:
+                (self.history_dir / filename).unlink()
+            except FileNotFoundError:
+                pass
+
+    def compact(self):
+        """
+        Pack loose snapshots and segments with dropped runs into one segment
+
+        Segments trimmed by retention still hold rows of dropped runs; those
+        are rewritten too so dead rows don't accumulate.
+        """
+        runs = self.manifest["runs"]
+        rows_by_file = {}
+        for run in runs:
+            rows_by_file[run["file"]] = rows_by_file.get(run["file"], 0) + run["rows"]
+
+        stored_rows = {}
+        for filename in rows_by_file:
+            if filename.startswith("segments/"):
+                with np.load(self.history_dir / filename, allow_pickle=False) as npz:
+                    stored_rows[filename] = len(npz["c0"]) if "c0" in npz.files else 0
+
+        to_pack = [
+            run for run in runs
+            if run["file"].startswith("snapshots/")
+            or stored_rows[run["file"]] > rows_by_file[run["file"]]
+        ]
+        if not to_pack:
+            return
+
+        cache = {}
+        parts = []
+        for run in to_pack:
+            if run["file"] not in cache:
+                cache[run["file"]] = self.read_arrays(run["file"])
+            arrays = cache[run["file"]]
+            parts.append({
+                name: values[run["offset"]:run["offset"] + run["rows"]]
+                for name, values in arrays.items()
+            })
+
+        names = list(dict.fromkeys(name for part in parts for name in part))
+        merged = {}
+        for name in names:
+            textual = any(part[name].dtype.kind == "U" for part in parts if name in part)
+            columns = []
+            for part, run in zip(parts, to_pack):
+                if name in part:
+                    values = part[name].astype(str) if textual else part[name]
+                else:
+                    values = np.full(run["rows"], "" if textual else np.nan)
+                columns.append(values)
+            merged[name] = np.concatenate(columns)
+
+        filename = f"segments/{to_pack[0]['run_id']}_{to_pack[-1]['run_id']}.npz"
+        self.write_arrays(filename, merged)
+
+        old_files = {run["file"] for run in to_pack}
+        offset = 0
+        for run in to_pack:
+            run["file"] = filename
+            run["offset"] = offset
+            offset += run["rows"]
+        self.remove_unreferenced(old_files)
+        print(f"Compacted {len(to_pack)} runs into {filename}")
+
+    def symbol_history(self, symbol, columns=("PnL",), last_n=10):
+        """
+        Values of a symbol's columns over the most recent runs
+
+        Args:
+            symbol (str): Pair as shown in the report, e.g. 'BTC/USDT' or 'TOTAL'
+            columns (tuple): Result columns to return
+            last_n (int): Number of most recent runs to scan
+        Returns:
+            DataFrame: One row per run containing the symbol
+        """
+        columns = list(columns)
+        runs = self.manifest["runs"][-last_n:]
+        cache = {}
+        rows = []
+        for run in runs:
+            if run["file"] not in cache:
+                cache[run["file"]] = self.read_arrays(run["file"], ["Pair"] + columns)
+            arrays = cache[run["file"]]
+            start, end = run["offset"], run["offset"] + run["rows"]
+            matches = np.flatnonzero(arrays["Pair"][start:end] == symbol)
+            if not len(matches):
+                continue
+            index = start + matches[0]
+            row = {"run": run["run_id"], "time": datetime.fromtimestamp(run["timestamp"])}
+            for column in columns:
+                row[column] = arrays[column][index] if column in arrays else None
+            rows.append(row)
+        return pd.DataFrame(rows, columns=["run", "time"] + columns)
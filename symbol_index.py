@@ -0,0 +1,114 @@
+from pathlib import Path
+import json
+import time
+
+DAY_MS = 86400 * 1000
+
+
+class SymbolIndex:
+    """
+    Persisted index of every pair ever traded or probed, with activity times
+
+    Entries map a raw exchange pair (e.g. 'ETH/BTC') to its last fill time,
+    the USD price of that fill and when it was last checked. The index
+    decides which pairs fetch_all_trades polls:
+      - active pairs (recent fills, or earlier fills and a non-dust balance
+        of the base) every run
+      - dormant pairs, including every pair never filled, once every
+        dormant_interval_days
+    """
+
+    def __init__(self, index_file, active_days=30, dormant_interval_days=7, dust_usd=1.0):
+        """
+        Args:
+            index_file (Path): JSON file holding the index
+            active_days (int): Pairs with fills this recent count as active
+            dormant_interval_days (int): Refresh interval of dormant pairs
+            dust_usd (float): Balances worth less than this don't make a pair active
+        """
+        self.index_file = Path(index_file)
+        self.active_days = active_days
+        self.dormant_interval_days = dormant_interval_days
+        self.dust_usd = dust_usd
+        self.entries = self.load()
+
+    def load(self):
+        """Load the index, empty if missing"""
+        try:
+            if self.index_file.exists():
+                with open(self.index_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading symbol index: {e}")
+        return {}
+
+    def save(self):
+        """Save the index"""
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_file, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+
+    def is_empty(self):
+        return not self.entries
+
+    def record_fills(self, last_fills, checked_at=None):
+        """
+        Update pairs from their latest fill
+
+        Args:
+            last_fills (dict): pair -> (last fill time in ms, USD price of that fill)
+            checked_at (int): Time in ms to record as last check, if given
+        """
+        for pair, (timestamp, price_usd) in last_fills.items():
+            entry = self.entries.setdefault(pair, {"last_trade": None, "last_price_usd": None, "last_checked": None})
+            if entry["last_trade"] is None or timestamp >= entry["last_trade"]:
+                entry["last_trade"] = int(timestamp)
+                if price_usd == price_usd:  # Not NaN
+                    entry["last_price_usd"] = float(price_usd)
+            if checked_at:
+                entry["last_checked"] = int(checked_at)
+
+    def record_checked(self, pairs, checked_at):
+        """Mark pairs as polled at checked_at (ms), adding never traded ones"""
+        for pair in pairs:
+            entry = self.entries.setdefault(pair, {"last_trade": None, "last_price_usd": None, "last_checked": None})
+            entry["last_checked"] = int(checked_at)
+
+    def base_prices(self):
+        """Latest known USD price of every base asset, across all its pairs"""
+        prices = {}
+        latest = {}
+        for pair, entry in self.entries.items():
+            base = pair.split("/")[0]
+            if entry.get("last_price_usd") is None:
+                continue
+            if (entry.get("last_trade") or 0) >= latest.get(base, -1):
+                latest[base] = entry.get("last_trade") or 0
+                prices[base] = entry["last_price_usd"]
+        return prices
+
+    def due_pairs(self, balance, now=None):
+        """
+        Indexed pairs to poll this run
+
+        Args:
+            balance (dict): Currency -> total amount held
+            now (int): Current time in ms
+        Returns:
+            tuple: (active pairs, dormant pairs due for a refresh)
+        """
+        now = now or int(time.time() * 1000)
+        # A holding keeps the traded pairs of its base active, pairs without a
+        # fill stay on the dormant schedule until they get one
+        prices = self.base_prices()
+        active, dormant = [], []
+        for pair, entry in self.entries.items():
+            base = pair.split("/")[0]
+            held = balance.get(base, 0) or 0
+            held_usd = held * (prices.get(base) or 0)
+            last_trade = entry.get("last_trade")
+            if last_trade and (held_usd >= self.dust_usd or now - last_trade < self.active_days * DAY_MS):
+                active.append(pair)
+            elif now - (entry.get("last_checked") or 0) >= self.dormant_interval_days * DAY_MS:
+                dormant.append(pair)
+        return sorted(active), sorted(dormant)
@@ -0,0 +1,160 @@
+from pathlib import Path
+import subprocess
+import pickle
+import time
+import sys
+import os
+
+
+class UploadQueue:
+    """
+    Persistent queue of pending Google Sheets uploads
+
+    Jobs are pickled payloads in Cache/upload_queue/. A detached worker
+    process drains them one at a time with exponential-backoff retries;
+    only the newest pending job is ever uploaded, older ones are dropped as
+    superseded. A lock file keeps at most one worker alive.
+    """
+
+    def __init__(self, queue_dir=Path("Cache") / "upload_queue", max_retries=8, base_delay=5, max_delay=600):
+        """
+        Args:
+            queue_dir (Path): Folder holding pending jobs, the lock and the worker log
+            max_retries (int): Upload attempts per job before giving up for this run
+            base_delay (float): Seconds before the first retry, doubled every attempt
+            max_delay (float): Upper bound of a single retry delay
+        """
+        self.queue_dir = Path(queue_dir)
+        self.lock_file = self.queue_dir / "worker.lock"
+        self.log_file = self.queue_dir / "worker.log"
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+
+    def pending(self):
+        """Pending job files, oldest first"""
+        return sorted(self.queue_dir.glob("*.job"))
+
+    def enqueue(self, payload):
+        """
+        Add an upload job and drop every older pending job
+
+        Args:
+            payload (dict): Data passed to the upload function
+        Returns:
+            Path: The job file
+        """
+        job_file = self.queue_dir / f"{time.time_ns()}.job"
+        tmp_file = job_file.with_suffix(".tmp")
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(payload, f)
+        tmp_file.replace(job_file)
+
+        for older in self.pending():
+            if older.name < job_file.name:
+                older.unlink(missing_ok=True)
+        return job_file
+
+    def worker_alive(self):
+        """True if the lock belongs to a running process"""
+        try:
+            pid = int(self.lock_file.read_text().strip())
+            os.kill(pid, 0)
+            return True
+        except (FileNotFoundError, ValueError, ProcessLookupError):
+            return False
+        except PermissionError:
+            return True
+
+    def acquire_lock(self):
+        """Take the worker lock, replacing a lock left by a dead worker"""
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(str(os.getpid()))
+                return True
+            except FileExistsError:
+                if self.worker_alive():
+                    return False
+                self.lock_file.unlink(missing_ok=True)
+        return False
+
+    def release_lock(self):
+        self.lock_file.unlink(missing_ok=True)
+
+    def start_worker(self):
+        """Spawn a detached worker draining the queue unless one is running"""
+        if self.worker_alive():
+            print("Upload queued, worker already running")
+            return
+        main_script = Path(__file__).resolve().parent / "main.py"
+        with open(self.log_file, 'a') as log:
+            subprocess.Popen(
+                [sys.executable, str(main_script), "--drain-uploads"],
+                stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        print(f"Upload queued, progress is logged to {self.log_file}")
+
+    def drain(self, upload):
+        """
+        Upload pending jobs until the queue is empty
+
+        Args:
+            upload (callable): Called with a job payload, raises on failure
+        """
+        # Jobs queued while the lock is being released are picked up by re-checking
+        while self.pending():
+            if not self.acquire_lock():
+                return
+            try:
+                if not self.process_pending(upload):
+                    return
+            finally:
+                self.release_lock()
+
+    def process_pending(self, upload):
+        """
+        Upload the newest job with retries, holding the worker lock
+
+        Returns:
+            bool: False if retries ran out and the job stays queued
+        """
+        while True:
+            jobs = self.pending()
+            if not jobs:
+                return True
+            job_file = jobs[-1]
+            for superseded in jobs[:-1]:
+                superseded.unlink(missing_ok=True)
+            try:
+                with open(job_file, 'rb') as f:
+                    payload = pickle.load(f)
+            except Exception as e:
+                print(f"Dropping unreadable upload job {job_file.name}: {e}")
+                job_file.unlink(missing_ok=True)
+                continue
+
+            for attempt in range(self.max_retries):
+                try:
+                    upload(payload)
+                    job_file.unlink(missing_ok=True)
+                    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} Uploaded {job_file.name}")
+                    break
+                except Exception as e:
+                    if attempt + 1 == self.max_retries:
+                        print(f"Upload attempt {attempt + 1} failed: {e}")
+                        continue
+                    delay = min(self.base_delay * 2 ** attempt, self.max_delay)
+                    print(f"Upload attempt {attempt + 1} failed: {e}, retrying in {delay}s")
+                    time.sleep(delay)
+                    if self.pending()[-1:] != [job_file]:
+                        print("Newer upload queued, dropping this one")
+                        job_file.unlink(missing_ok=True)
+                        break
+            else:
+                # Keep the job for the next run instead of retrying forever
+                print(f"Giving up on {job_file.name} for now, it stays queued")
+                return False